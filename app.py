@@ -150,75 +150,65 @@ def clear_session_token():
     if 'uid' in st.query_params:
         del st.query_params['uid']
 import random
-from passport_ocr import extract_passport_data
+from passport_ocr import scan_passports
 from hotel_resolver import resolve_hotel_safe
 from airports import AIRPORTS, get_airport_options, get_airport_code, format_airport_display
-from flight_ocr import extract_flight_data
+from flight_ocr import extract_flights_data
 from streamlit_paste_button import paste_image_button
 from stadium_api import get_team_info, get_team_map_path, get_all_teams
-from concerts_service import fetch_venue_map_from_ticketmaster, is_ticketmaster_url
-from google import genai
+from concerts_service import fetch_venue_map_from_ticketmaster, is_ticketmaster_url, start_cache_refresher
+from rate_history import start_rate_history_sync
+import http_replay
+import gemini_client
+import chat_assistant
 
 def get_gemini_client():
-    """Get Gemini client for AI chat"""
-    api_key = os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY")
-    base_url = os.environ.get("AI_INTEGRATIONS_GEMINI_BASE_URL")
-    
-    if not api_key:
+    """Get the shared Gemini client for AI chat"""
+    if not os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY"):
         return None
     
     try:
-        return genai.Client(
-            api_key=api_key,
-            http_options={
-                'api_version': '',
-                'base_url': base_url
-            }
-        )
+        return gemini_client.get_client()
     except Exception:
         return None
 
-def ai_chat_response(question: str) -> str:
-    """Generate AI response for user question about TikTik system"""
+# Longest time a chatbot answer may take to stream, including retries
+CHAT_TIMEOUT_SECONDS = 20
+
+def ai_chat_stream(question: str):
+    """Stream the AI answer to a user question about the TikTik system, chunk by chunk"""
+    answer, _ = chat_assistant.answer_question(question)
+    if answer:
+        yield answer
+        return
+    
     client = get_gemini_client()
     if not client:
-        return "שירות הצ'אט אינו זמין כרגע. פנה למנהל המערכת."
-    
-    system_prompt = """אתה עוזר וירטואלי של מערכת TikTik. ענה בעברית קצר וברור.
-
-בעיות נפוצות ופתרונות:
-
-❓ "העליתי דרכון ולא קורה כלום"
-✅ תשובה: לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק דרכון"!
-
-❓ "העליתי צילום טיסה ולא קורה כלום"  
-✅ תשובה: לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק טיסה"!
-
-❓ "איפה שער ההמרה?"
-✅ תשובה: שער ההמרה מתעדכן אוטומטית (שער בנק ישראל + 5 אגורות). אין צורך להזין.
-
-❓ "איך שולחים ללקוח?"
-✅ תשובה: לחץ "צור PDF והורד", ושלח את הקובץ ללקוח דרך וואטסאפ.
-
-מידע על המערכת:
-- TikTik מוכרת כרטיסים למשחקי כדורגל והופעות באירופה
-- "חבילה מלאה" = מלון + טיסות + העברות + כרטיסים
-- "כרטיסים בלבד" = רק כרטיסים
-- סריקת דרכון: העלה תמונה → לחץ "סרוק דרכון" → פרטים יתמלאו
-- סריקת טיסה: העלה צילום מסך → לחץ "סרוק טיסה" → פרטים יתמלאו
-- מלונות: הקלד שם → לחץ "חפש מלון" → פרטים יתמלאו
-- מפות אצטדיון מופיעות אוטומטית לפי הקבוצה
-
-ענה קצר וממוקד. אם לא יודע - הפנה לעמוד העזרה (כפתור ❓)."""
+        yield "שירות הצ'אט אינו זמין כרגע. פנה למנהל המערכת."
+        return
     
+    chunks = []
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=f"{system_prompt}\n\nשאלת המשתמש: {question}"
-        )
-        return response.text or "לא הצלחתי לענות. נסה שוב."
+        for text in gemini_client.generate_content_stream(
+            contents=chat_assistant.build_prompt(question),
+            max_attempts=2,
+            deadline_seconds=CHAT_TIMEOUT_SECONDS
+        ):
+            chunks.append(text)
+            # Keep the partial answer, so a cancelled question still shows what arrived
+            st.session_state.ai_streaming = {"question": question, "answer": ''.join(chunks)}
+            yield text
     except Exception as e:
-        return f"שגיאה: לא הצלחתי לעבד את השאלה. נסה שוב מאוחר יותר."
+        if chunks:
+            yield "\n\n⏱️ התשובה נקטעה. נסה שוב."
+        else:
+            yield "שגיאה: לא הצלחתי לעבד את השאלה. נסה שוב מאוחר יותר."
+        return
+    
+    if chunks:
+        chat_assistant.cache_answer(question, ''.join(chunks))
+    else:
+        yield "לא הצלחתי לענות. נסה שוב."
 
 def render_ai_chatbot():
     """Render AI chatbot widget in sidebar"""
@@ -231,6 +221,15 @@ def render_ai_chatbot():
     if 'ai_chat_input' not in st.session_state:
         st.session_state.ai_chat_input = ""
     
+    # The stop button reruns the script, which ends the running stream - keep what arrived so far
+    if st.session_state.get('ai_streaming'):
+        partial = st.session_state.pop('ai_streaming')
+        if st.session_state.get('cancel_ai_answer'):
+            st.session_state.ai_chat_history.append({
+                "question": partial['question'],
+                "answer": f"{partial['answer']} ⏹️ (נעצר)"
+            })
+    
     with st.sidebar.expander("💬 שאל שאלה", expanded=False):
         user_question = st.text_input(
             "הקלד שאלה",
@@ -240,12 +239,18 @@ def render_ai_chatbot():
         
         if st.button("שלח", key="send_ai_question", use_container_width=True):
             if user_question.strip():
-                with st.spinner("חושב..."):
-                    response = ai_chat_response(user_question)
-                    st.session_state.ai_chat_history.append({
-                        "question": user_question,
-                        "answer": response
-                    })
+                # Streamed into a placeholder, then shown with the rest of the history below
+                stream_area = st.empty()
+                with stream_area.container():
+                    st.button("⏹️ עצור", key="cancel_ai_answer")
+                    st.markdown(f"**🙋 שאלה:** {user_question}")
+                    response = st.write_stream(ai_chat_stream(user_question))
+                stream_area.empty()
+                st.session_state.pop('ai_streaming', None)
+                st.session_state.ai_chat_history.append({
+                    "question": user_question,
+                    "answer": response if isinstance(response, str) else ''.join(map(str, response))
+                })
         
         if st.session_state.ai_chat_history:
             st.markdown("---")
@@ -259,7 +264,11 @@ def render_ai_chatbot():
             st.session_state.ai_chat_history = []
             st.rerun()
 
+# Offline record/replay of external APIs when HTTP_REPLAY_MODE is set (see http_replay.py)
+http_replay.install_from_env()
 init_db()
+start_cache_refresher()
+start_rate_history_sync()
 
 st.set_page_config(
     page_title="TikTik Smart Order System",
@@ -1290,6 +1299,32 @@ def delete_saved_artist(artist_id):
     finally:
         db.close()
 
+ORDER_HISTORY_PAGE_SIZE = 20
+
+def _filtered_orders_query(db, search_query=None, status_filter=None, user_id=None, is_admin=False):
+    """Orders query with the history page's filters, newest first (ties broken by id)"""
+    query = db.query(Order).order_by(Order.created_at.desc(), Order.id.desc())
+    
+    if not is_admin and user_id:
+        query = query.filter(Order.user_id == user_id)
+    
+    if search_query:
+        from order_search import apply_search
+        query = apply_search(query, search_query)
+    
+    if status_filter and status_filter != "הכל":
+        status_map = {
+            "טיוטה": OrderStatus.DRAFT,
+            "נשלח": OrderStatus.SENT,
+            "נצפה": OrderStatus.VIEWED,
+            "נחתם": OrderStatus.SIGNED,
+            "בוטל": OrderStatus.CANCELLED
+        }
+        if status_filter in status_map:
+            query = query.filter(Order.status == status_map[status_filter])
+    
+    return query
+
 def get_all_orders(search_query=None, status_filter=None, user_id=None, is_admin=False):
     """Get all orders with optional filtering"""
     db = get_db()
@@ -1297,37 +1332,57 @@ def get_all_orders(search_query=None, status_filter=None, user_id=None, is_admin
         return []
     
     try:
-        query = db.query(Order).order_by(Order.created_at.desc())
-        
-        if not is_admin and user_id:
-            query = query.filter(Order.user_id == user_id)
-        
-        if search_query:
-            search = f"%{search_query}%"
-            query = query.filter(
-                (Order.customer_name.ilike(search)) |
-                (Order.event_name.ilike(search)) |
-                (Order.order_number.ilike(search)) |
-                (Order.customer_email.ilike(search))
-            )
-        
-        if status_filter and status_filter != "הכל":
-            status_map = {
-                "טיוטה": OrderStatus.DRAFT,
-                "נשלח": OrderStatus.SENT,
-                "נצפה": OrderStatus.VIEWED,
-                "נחתם": OrderStatus.SIGNED,
-                "בוטל": OrderStatus.CANCELLED
-            }
-            if status_filter in status_map:
-                query = query.filter(Order.status == status_map[status_filter])
-        
-        return query.all()
+        return _filtered_orders_query(db, search_query, status_filter, user_id, is_admin).all()
     except Exception as e:
         return []
     finally:
         db.close()
 
+def get_orders_pages(search_query=None, status_filter=None, user_id=None, is_admin=False,
+                     num_pages=1, page_size=ORDER_HISTORY_PAGE_SIZE):
+    """
+    Get the first num_pages pages of orders, newest first.
+    Pages are read with keyset pagination on (created_at, id): each page continues after
+    the last row of the previous one, so every query is an index range scan of page_size rows
+    no matter how many orders exist. With a search query, results come ranked by relevance.
+    
+    Returns:
+        (orders, has_more)
+    """
+    db = get_db()
+    if not db:
+        return [], False
+    
+    try:
+        from sqlalchemy import tuple_
+        from order_search import search_terms, rank_search
+        if search_terms(search_query or ''):
+            # Search results are ranked by relevance, so they are paged by count rather than by date
+            query = rank_search(db, _filtered_orders_query(db, search_query, status_filter, user_id, is_admin), search_query)
+            orders = query.limit(num_pages * page_size + 1).all()
+            return orders[:num_pages * page_size], len(orders) > num_pages * page_size
+        
+        orders = []
+        cursor = None
+        for _ in range(num_pages):
+            query = _filtered_orders_query(db, search_query, status_filter, user_id, is_admin)
+            if cursor:
+                query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(*cursor))
+            # One extra row tells whether another page exists
+            page = query.limit(page_size + 1).all()
+            has_more = len(page) > page_size
+            page = page[:page_size]
+            orders.extend(page)
+            if not has_more or page[-1].created_at is None:
+                return orders, False
+            cursor = (page[-1].created_at, page[-1].id)
+        return orders, True
+    except Exception as e:
+        print(f"Error loading orders: {e}")
+        return [], False
+    finally:
+        db.close()
+
 def get_status_badge(status):
     """Get HTML badge for status"""
     status_config = {
@@ -1627,7 +1682,7 @@ def page_new_order():
                     'random_data', 'passenger_list', 'order_generated', 'pdf_bytes',
                     'current_order_number', 'current_order_id', 'selected_team_data',
                     'away_team_data', 'home_team_hebrew', 'away_team_hebrew',
-                    'football_league', 'hotel_data', 'pasted_passport', 'pasted_flight',
+                    'football_league', 'hotel_data', 'pasted_passport', 'pasted_flight', 'pasted_flight_hash',
                     'worldcup_match', 'worldcup_venue', 'fixture_data', 'worldcup_stadium_map',
                     'pasted_stadium_map', 'saved_stadium_map_path', 'saved_stadium_map_bytes', '_selected_concert',
                     '_from_saved_concert', 'concert_venue_info', 'concert_artist_en',
@@ -3057,31 +3112,38 @@ def page_new_order():
             
             col_flight_upload, col_flight_paste = st.columns([3, 1])
             with col_flight_upload:
-                flight_screenshot = st.file_uploader(
-                    "📷 העלה צילום מסך של טיסות",
+                flight_screenshots = st.file_uploader(
+                    "📷 העלה צילומי מסך של טיסות (הלוך וחזור יכולים להיות בקבצים נפרדים)",
                     type=['png', 'jpg', 'jpeg'],
                     key="flight_scan_upload",
-                    help="צלם מסך מאתר הזמנת הטיסות והעלה כאן"
+                    accept_multiple_files=True,
+                    help="צלם מסך מאתר הזמנת הטיסות והעלה כאן - כל הצילומים נסרקים יחד"
                 )
             with col_flight_paste:
                 flight_paste = paste_image_button("📋 הדבק טיסות", key="flight_paste")
                 if flight_paste.image_data:
-                    st.session_state['pasted_flight'] = flight_paste.image_data
-                    st.image(flight_paste.image_data, caption="צילום מסך שהודבק", width=100)
+                    # The paste button keeps returning its last image - skip one that was already scanned
+                    paste_buffer = io.BytesIO()
+                    flight_paste.image_data.save(paste_buffer, format='PNG')
+                    paste_hash = hashlib.sha256(paste_buffer.getvalue()).hexdigest()
+                    if paste_hash != st.session_state.get('scanned_flight_paste'):
+                        st.session_state['pasted_flight'] = flight_paste.image_data
+                        st.session_state['pasted_flight_hash'] = paste_hash
+                        st.image(flight_paste.image_data, caption="צילום מסך שהודבק", width=100)
             
             scan_flights_btn = st.button("🔍 סרוק פרטי טיסות", type="secondary", use_container_width=True)
             
-            flight_image_to_scan = flight_screenshot or st.session_state.get('pasted_flight')
+            flight_image_to_scan = flight_screenshots or st.session_state.get('pasted_flight')
             if scan_flights_btn and flight_image_to_scan:
                 with st.spinner("סורק פרטי טיסות..."):
-                    if flight_screenshot:
-                        image_bytes = flight_screenshot.read()
-                    else:
+                    # All screenshots go to the model in one request and come back as one itinerary
+                    flight_images = [fs.read() for fs in flight_screenshots or []]
+                    if st.session_state.get('pasted_flight'):
                         pasted_img = st.session_state['pasted_flight']
                         img_byte_arr = io.BytesIO()
                         pasted_img.save(img_byte_arr, format='PNG')
-                        image_bytes = img_byte_arr.getvalue()
-                    result = extract_flight_data(image_bytes)
+                        flight_images.append(img_byte_arr.getvalue())
+                    result = extract_flights_data(flight_images)
                     
                     if result.get('success') and result.get('flights'):
                         flights = result['flights']
@@ -3115,11 +3177,15 @@ def page_new_order():
                                 st.session_state[f"flight_{direction}_time"] = f.get('time', '')
                                 st.session_state[f"flight_{direction}_no"] = f.get('flight_no', '')
                         
+                        # A paste is used by one scan only, so it can't leak into a later upload
+                        if st.session_state.pop('pasted_flight', None) is not None:
+                            st.session_state['scanned_flight_paste'] = st.session_state.pop('pasted_flight_hash', None)
+                        
                         st.success(f"✅ נסרקו {len(flights)} טיסות!")
                         st.rerun()
                     else:
                         st.error(f"❌ לא הצלחנו לזהות פרטי טיסות: {result.get('error', 'נסה תמונה ברורה יותר')}")
-            elif scan_flights_btn and not flight_screenshot:
+            elif scan_flights_btn and not flight_image_to_scan:
                 st.warning("⚠️ יש להעלות צילום מסך לפני הסריקה")
             
             st.markdown("**טיסת הלוך:**")
@@ -3272,7 +3338,7 @@ def page_new_order():
         
         category = st.text_input("קטגוריה", value=default_category, placeholder="CAT 1 / VIP / Premium")
         
-        from exchange_rates import fetch_exchange_rates, get_currency_symbol, get_currency_name_hebrew
+        from exchange_rates import fetch_exchange_rates, get_rates_status, get_currency_symbol, get_currency_name_hebrew
         
         currency_options = ['EUR', 'USD', 'GBP']
         currency_labels = ['€ יורו', '$ דולר', '£ פאונד']
@@ -3293,11 +3359,22 @@ def page_new_order():
         
         rates = fetch_exchange_rates()
         exchange_rate = rates.get(selected_currency, 3.78)
+        rates_status = get_rates_status()
+        if rates_status['freshness'] == 'default':
+            rate_freshness = '<span style="color: #c0392b; font-size: 12px;">⚠️ שער ברירת מחדל - בנק ישראל לא זמין, יש לוודא את השער</span>'
+        elif rates_status['freshness'] == 'stale' and (rates_status['breaker']['state'] != 'closed' or rates_status['breaker']['failures']):
+            rate_freshness = f'<span style="color: #d35400; font-size: 12px;">⚠️ עודכן לפני {rates_status["age_minutes"] // 60} שעות - בנק ישראל לא זמין כרגע</span>'
+        elif rates_status['freshness'] == 'stale':
+            # Normal after an idle period - a background refresh is already running
+            rate_freshness = f'<span style="color: #666; font-size: 12px;">עודכן לפני {rates_status["age_minutes"] // 60} שעות - מתעדכן ברקע</span>'
+        else:
+            rate_freshness = f'<span style="color: #666; font-size: 12px;">עודכן לפני {rates_status["age_minutes"]} דק\'</span>'
         
         st.markdown(f"""
         <div style="background: #f0f2f6; padding: 10px; border-radius: 8px; margin: 10px 0;">
             📊 שער המרה ({currency_name} לשקל): <strong>{exchange_rate}</strong> ₪ 
             <span style="color: #666; font-size: 12px;">(כולל מרווח 5 אג')</span>
+            {rate_freshness}
         </div>
         """, unsafe_allow_html=True)
         
@@ -3375,55 +3452,62 @@ def page_new_order():
             if st.session_state.get('pasted_passport'):
                 images_to_scan.append(('pasted', st.session_state['pasted_passport']))
             
-            for idx, (source_type, passport_data) in enumerate(images_to_scan):
-                source_name = f"דרכון מהלוח" if source_type == 'pasted' else passport_data.name
-                status_text.text(f"🔄 סורק {source_name} ({idx + 1} מתוך {len(images_to_scan)})...")
-                progress_bar.progress((idx + 1) / len(images_to_scan))
-                
+            # Read all images up front - uploads are not safe to touch from worker threads
+            source_names = []
+            image_bytes_list = []
+            for source_type, passport_data in images_to_scan:
+                source_names.append(f"דרכון מהלוח" if source_type == 'pasted' else passport_data.name)
                 if source_type == 'file':
-                    image_bytes = passport_data.read()
+                    image_bytes_list.append(passport_data.read())
                 else:
                     img_byte_arr = io.BytesIO()
                     passport_data.save(img_byte_arr, format='PNG')
-                    image_bytes = img_byte_arr.getvalue()
+                    image_bytes_list.append(img_byte_arr.getvalue())
+            
+            is_first_empty = len(st.session_state.passenger_list) == 1 and not st.session_state.passenger_list[0].get('first_name')
+            status_text.text(f"🔄 סורק {len(images_to_scan)} דרכונים...")
+            
+            # Passengers are added as each scan finishes, in completion order
+            for done, (idx, result) in enumerate(scan_passports(image_bytes_list), start=1):
+                source_name = source_names[idx]
+                progress_bar.progress(done / len(images_to_scan))
+                engine = {'mrz': 'MRZ', 'gemini': 'Gemini'}.get(result.get('engine'), 'מטמון' if result.get('from_cache') else '')
+                status_text.text(f"🔄 נסרקו {done} מתוך {len(images_to_scan)} ({source_name}{', ' + engine if engine else ''})...")
                 
-                result = extract_passport_data(image_bytes)
+                if not result.get('success'):
+                    st.error(f"❌ שגיאה בסריקת {source_name}: {result.get('error', 'לא ניתן לקרוא')}")
+                    continue
+                
+                passenger = {
+                    'first_name': result.get('first_name', ''),
+                    'last_name': result.get('last_name', ''),
+                    'passport': result.get('passport_number', ''),
+                    'birth_date': result.get('birth_date', ''),
+                    'passport_expiry': result.get('passport_expiry', ''),
+                    'ticket_type': 'כרטיס רגיל'
+                }
                 
-                if result.get('success'):
-                    scanned_passengers.append({
-                        'first_name': result.get('first_name', ''),
-                        'last_name': result.get('last_name', ''),
-                        'passport': result.get('passport_number', ''),
-                        'birth_date': result.get('birth_date', ''),
-                        'passport_expiry': result.get('passport_expiry', ''),
-                        'ticket_type': 'כרטיס רגיל'
-                    })
+                if is_first_empty and not scanned_passengers:
+                    passenger_idx = 0
+                    st.session_state.passenger_list[0] = passenger
                 else:
-                    st.error(f"❌ שגיאה בסריקת {source_name}: {result.get('error', 'לא ניתן לקרוא')}")
-            
-            if scanned_passengers:
-                is_first_empty = len(st.session_state.passenger_list) == 1 and not st.session_state.passenger_list[0].get('first_name')
+                    passenger_idx = len(st.session_state.passenger_list)
+                    st.session_state.passenger_list.append(passenger)
+                scanned_passengers.append(passenger)
                 
-                for i, passenger in enumerate(scanned_passengers):
-                    if is_first_empty and i == 0:
-                        passenger_idx = 0
-                        st.session_state.passenger_list[0] = passenger
-                    else:
-                        passenger_idx = len(st.session_state.passenger_list)
-                        st.session_state.passenger_list.append(passenger)
-                    
-                    for key in [f"first_name_{passenger_idx}", f"last_name_{passenger_idx}", 
-                               f"passport_{passenger_idx}", f"birth_date_{passenger_idx}", 
-                               f"passport_expiry_{passenger_idx}"]:
-                        if key in st.session_state:
-                            del st.session_state[key]
-                    
-                    st.session_state[f"first_name_{passenger_idx}"] = passenger['first_name']
-                    st.session_state[f"last_name_{passenger_idx}"] = passenger['last_name']
-                    st.session_state[f"passport_{passenger_idx}"] = passenger['passport']
-                    st.session_state[f"birth_date_{passenger_idx}"] = passenger['birth_date']
-                    st.session_state[f"passport_expiry_{passenger_idx}"] = passenger['passport_expiry']
+                for key in [f"first_name_{passenger_idx}", f"last_name_{passenger_idx}", 
+                           f"passport_{passenger_idx}", f"birth_date_{passenger_idx}", 
+                           f"passport_expiry_{passenger_idx}"]:
+                    if key in st.session_state:
+                        del st.session_state[key]
                 
+                st.session_state[f"first_name_{passenger_idx}"] = passenger['first_name']
+                st.session_state[f"last_name_{passenger_idx}"] = passenger['last_name']
+                st.session_state[f"passport_{passenger_idx}"] = passenger['passport']
+                st.session_state[f"birth_date_{passenger_idx}"] = passenger['birth_date']
+                st.session_state[f"passport_expiry_{passenger_idx}"] = passenger['passport_expiry']
+            
+            if scanned_passengers:
                 status_text.text(f"✅ סריקה הושלמה! {len(scanned_passengers)} נוסעים נוספו.")
                 st.rerun()
             else:
@@ -3884,13 +3968,20 @@ def page_order_history():
     user = st.session_state.get('user', {})
     user_id = user.get('id')
     is_admin = user.get('is_admin', False)
-    orders = get_all_orders(search_query, status_filter, user_id, is_admin)
+    
+    # A new search or filter starts again from the first page
+    history_filters = (search_query, status_filter)
+    if st.session_state.get('order_history_filters') != history_filters:
+        st.session_state.order_history_filters = history_filters
+        st.session_state.order_history_pages = 1
+    orders, has_more = get_orders_pages(search_query, status_filter, user_id, is_admin,
+                                        num_pages=st.session_state.order_history_pages)
     
     if not orders:
         st.info("לא נמצאו הזמנות")
         return
     
-    st.markdown(f"**נמצאו {len(orders)} הזמנות**")
+    st.markdown(f"**מוצגות {len(orders)} הזמנות{' (יש עוד)' if has_more else ''}**")
     
     for order in orders:
         with st.container():
@@ -3948,6 +4039,11 @@ def page_order_history():
                     if st.button("🗑️ מחק", key=delete_key):
                         st.session_state[confirm_key] = True
                         st.rerun()
+    
+    if has_more:
+        if st.button("⬇️ טען עוד הזמנות", key="load_more_orders", use_container_width=True):
+            st.session_state.order_history_pages += 1
+            st.rerun()
 
 def page_export():
     """Export page for Excel reports"""
@@ -3990,7 +4086,21 @@ def page_export():
                     ws.title = "הזמנות"
                     
                     headers = ["מספר הזמנה", "תאריך", "אירוע", "לקוח", "אימייל", "טלפון", 
-                               "בלוק", "שורה", "מושבים", "כרטיסים", "סה\"כ יורו", "סה\"כ ש\"ח", "סטטוס"]
+                               "בלוק", "שורה", "מושבים", "כרטיסים", "סה\"כ יורו", "סה\"כ ש\"ח", "סטטוס",
+                               "שער שהוחל", "שער בנק ישראל", "מרווח שער", "סה\"כ ש\"ח בשער היום"]
+                    
+                    # Historical Bank of Israel rates for all rows at once
+                    rate_report = None
+                    try:
+                        import pandas as pd
+                        from rate_history import add_rate_columns
+                        rate_report = add_rate_columns(pd.DataFrame({
+                            'created_at': [order.created_at for order in orders],
+                            'total_euro': [order.total_euro for order in orders],
+                            'exchange_rate': [order.exchange_rate for order in orders]
+                        }))
+                    except Exception as e:
+                        print(f"Rate history for export failed: {e}")
                     
                     header_fill = PatternFill(start_color="667eea", end_color="667eea", fill_type="solid")
                     header_font = Font(bold=True, color="FFFFFF")
@@ -4023,6 +4133,12 @@ def page_export():
                         ws.cell(row=row, column=11, value=order.total_euro)
                         ws.cell(row=row, column=12, value=order.total_nis)
                         ws.cell(row=row, column=13, value=status_hebrew.get(order.status, ''))
+                        ws.cell(row=row, column=14, value=order.exchange_rate)
+                        if rate_report is not None:
+                            report_row = rate_report.iloc[row - 2]
+                            for col, key in ((15, 'boi_rate'), (16, 'rate_margin'), (17, 'nis_today')):
+                                if pd.notna(report_row[key]):
+                                    ws.cell(row=row, column=col, value=round(float(report_row[key]), 2))
                     
                     for col in ws.columns:
                         max_length = 0
@@ -4606,6 +4722,60 @@ def page_user_management():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+def page_api_quotas():
+    """Admin page showing the remaining request budget per external API provider"""
+    from rate_limiter import get_quota_status, PROVIDER_NAMES
+    
+    st.markdown("""
+    <div class="header-container">
+        <h1>📡 מכסות API</h1>
+        <p>יתרת בקשות זמינה לכל ספק חיצוני</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if st.button("⬅️ חזרה לתפריט"):
+        st.session_state.admin_page = None
+        st.rerun()
+    
+    st.markdown("---")
+    
+    if st.button("🔄 רענן", key="refresh_api_quotas"):
+        st.rerun()
+    
+    status = get_quota_status()
+    if status and not status[0]['shared']:
+        st.warning("⚠️ מסד הנתונים אינו זמין - מוצגת מכסה מקומית לתהליך זה בלבד")
+    
+    bucket_names = {'burst': 'לשנייה', 'daily': 'יומית'}
+    for provider in dict.fromkeys(b['provider'] for b in status):
+        st.markdown(f"### {PROVIDER_NAMES.get(provider, provider)}")
+        buckets = [b for b in status if b['provider'] == provider]
+        cols = st.columns(len(buckets))
+        for col, bucket in zip(cols, buckets):
+            with col:
+                remaining = int(bucket['remaining'])
+                capacity = int(bucket['capacity'])
+                st.metric(
+                    f"מכסה {bucket_names.get(bucket['bucket'], bucket['bucket'])}",
+                    f"{remaining:,} / {capacity:,}"
+                )
+                st.progress(min(1.0, bucket['remaining'] / bucket['capacity']) if bucket['capacity'] else 0.0)
+                st.caption(f"בקשות: {bucket['total_requests']:,} | נחסמו: {bucket['throttled_requests']:,}")
+    
+    from exchange_rates import fetch_exchange_rates, get_rates_status
+    fetch_exchange_rates()
+    rates_status = get_rates_status()
+    breaker_names = {'closed': '🟢 תקין', 'open': '🔴 מנותק זמנית', 'half_open': '🟡 בבדיקת התאוששות'}
+    st.markdown("### שערי בנק ישראל")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("מצב חיבור", breaker_names.get(rates_status['breaker']['state'], rates_status['breaker']['state']))
+    with col2:
+        age = rates_status['age_minutes']
+        st.metric("עדכון אחרון", f"לפני {age} דק'" if age is not None else "שער ברירת מחדל")
+    if rates_status['breaker']['last_error']:
+        st.caption(f"שגיאה אחרונה: {rates_status['breaker']['last_error']}")
+
 def page_change_password():
     """Page for users to change their own password"""
     st.markdown("""
@@ -5602,6 +5772,8 @@ def main():
             st.session_state.admin_page = "images"
         if st.sidebar.button("👥 ניהול משתמשים", use_container_width=True):
             st.session_state.admin_page = "users"
+        if st.sidebar.button("📡 מכסות API", use_container_width=True):
+            st.session_state.admin_page = "api_quotas"
     
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪 התנתק", use_container_width=True):
@@ -5630,6 +5802,8 @@ def main():
         page_change_password()
     elif st.session_state.get("admin_page") == "users" and is_admin:
         page_user_management()
+    elif st.session_state.get("admin_page") == "api_quotas" and is_admin:
+        page_api_quotas()
     elif page == "📋 היסטוריית הזמנות":
         page_order_history()
     elif page == "📊 ייצוא דוחות":
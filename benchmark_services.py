@@ -0,0 +1,172 @@
+"""
+Service Benchmark
+Load-tests the concert search, hotel resolve, football fixture and exchange rate
+pipelines against recorded API responses (see http_replay.py), so they can be
+profiled on a machine with no network.
+
+Record fixtures once (needs API keys and network):
+    python benchmark_services.py --mode record --iterations 1
+
+Then benchmark offline:
+    python benchmark_services.py --mode replay --latency-ms 120 --iterations 50 --concurrency 8
+    python benchmark_services.py --mode replay --scenario concerts --profile
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_replay
+
+DEFAULT_ARTIST = ('Coldplay', 'K8vZ9171izV')
+DEFAULT_HOTEL = 'Hilton Madrid Airport, Madrid'
+DEFAULT_FIXTURE = ('Real Madrid', 'Barcelona', 'Spanish La Liga')
+
+
+def _use_replay_keys():
+    """API keys are stripped from fixtures, so any non-empty key works in replay mode"""
+    import concerts_service
+    import hotel_resolver
+    concerts_service.TICKETMASTER_API_KEY = concerts_service.TICKETMASTER_API_KEY or 'replay'
+    concerts_service.RAPIDAPI_KEY = concerts_service.RAPIDAPI_KEY or 'replay'
+    hotel_resolver.GOOGLE_PLACES_API_KEY = hotel_resolver.GOOGLE_PLACES_API_KEY or 'replay'
+
+
+def run_concerts():
+    import concerts_service
+    concerts_service.clear_cache()
+    concerts_service._url_cache.clear()
+    artist_name, attraction_id = DEFAULT_ARTIST
+    return concerts_service.search_events_combined(artist_name, attraction_id, size=50, force_refresh=True)
+
+
+def run_hotel():
+    import hotel_resolver
+    return hotel_resolver.resolve_hotel_safe(DEFAULT_HOTEL, order_id='benchmark')
+
+
+def run_fixtures():
+    import sports_api
+    sports_api.get_season_fixtures.cache_clear()
+    home, away, league = DEFAULT_FIXTURE
+    return sports_api.find_fixture(home, away, league)
+
+
+def run_rates():
+    import exchange_rates
+    # The shared rate cache would answer without the network - measure the BOI fetch itself
+    return exchange_rates.fetch_base_observations()
+
+
+SCENARIOS = {
+    'concerts': run_concerts,
+    'hotel': run_hotel,
+    'fixtures': run_fixtures,
+    'rates': run_rates,
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def benchmark(name: str, iterations: int, concurrency: int) -> dict:
+    """Run one scenario `iterations` times across `concurrency` threads and time each call"""
+    func = SCENARIOS[name]
+
+    def timed(_):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = func()
+            if isinstance(result, dict) and result.get('error'):
+                error = result['error']
+        except Exception as e:
+            error = str(e)
+        return time.perf_counter() - start, error
+
+    wall_start = time.perf_counter()
+    if concurrency <= 1:
+        results = [timed(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - wall_start
+
+    durations = [d for d, _ in results]
+    errors = [e for _, e in results if e]
+    return {
+        'scenario': name,
+        'iterations': iterations,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'mean_ms': statistics.mean(durations) * 1000,
+        'p50_ms': _percentile(durations, 50) * 1000,
+        'p95_ms': _percentile(durations, 95) * 1000,
+        'max_ms': max(durations) * 1000,
+        'throughput': iterations / wall if wall else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark service modules against recorded API responses")
+    parser.add_argument('--mode', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--fixtures', default=http_replay.DEFAULT_FIXTURES_DIR, help="Fixture directory")
+    parser.add_argument('--scenario', choices=list(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=None,
+                        help="Fixed latency per replayed response (default: recorded latency)")
+    parser.add_argument('--latency-scale', type=float, default=1.0, help="Multiplier for recorded latency")
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep-rate-limits', action='store_true',
+                        help="Apply the provider rate limiter (off by default so load tests measure the pipeline)")
+    parser.add_argument('--profile', action='store_true', help="Print the top functions by cumulative time")
+    args = parser.parse_args()
+
+    if not args.keep_rate_limits:
+        import rate_limiter
+        rate_limiter.PROVIDER_LIMITS = {}
+
+    # Database caches would hide the API calls being recorded or measured
+    os.environ.pop('DATABASE_URL', None)
+    if args.mode == 'replay':
+        _use_replay_keys()
+    if args.profile and args.concurrency > 1:
+        print("Profiling only covers the main thread, running with --concurrency 1")
+        args.concurrency = 1
+
+    http_replay.install(args.mode, args.fixtures, latency_ms=args.latency_ms,
+                        latency_scale=args.latency_scale, jitter_ms=args.jitter_ms, seed=args.seed)
+
+    names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        reports = [benchmark(name, args.iterations, args.concurrency) for name in names]
+    finally:
+        if profiler:
+            profiler.disable()
+        http_replay.uninstall()
+
+    print(f"{'scenario':<10} {'iter':>5} {'err':>4} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'req/s':>8}")
+    for r in reports:
+        print(f"{r['scenario']:<10} {r['iterations']:>5} {r['errors']:>4} {r['mean_ms']:>8.1f}ms "
+              f"{r['p50_ms']:>8.1f}ms {r['p95_ms']:>8.1f}ms {r['max_ms']:>8.1f}ms {r['throughput']:>8.1f}")
+        if r['first_error']:
+            print(f"  first error: {r['first_error']}")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+AI Chat Assistant
+Answers agent questions in the sidebar chatbot. Questions are first matched
+against a local FAQ index (normalized Hebrew words + character trigrams) and
+answered instantly when the match is confident; otherwise Gemini answers and
+the answer is cached by normalized question, shared by all sessions.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+SYSTEM_PROMPT = """אתה עוזר וירטואלי של מערכת TikTik. ענה בעברית קצר וברור.
+
+בעיות נפוצות ופתרונות:
+
+❓ "העליתי דרכון ולא קורה כלום"
+✅ תשובה: לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק דרכון"!
+
+❓ "העליתי צילום טיסה ולא קורה כלום"
+✅ תשובה: לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק טיסה"!
+
+❓ "איפה שער ההמרה?"
+✅ תשובה: שער ההמרה מתעדכן אוטומטית (שער בנק ישראל + 5 אגורות). אין צורך להזין.
+
+❓ "איך שולחים ללקוח?"
+✅ תשובה: לחץ "צור PDF והורד", ושלח את הקובץ ללקוח דרך וואטסאפ.
+
+מידע על המערכת:
+- TikTik מוכרת כרטיסים למשחקי כדורגל והופעות באירופה
+- "חבילה מלאה" = מלון + טיסות + העברות + כרטיסים
+- "כרטיסים בלבד" = רק כרטיסים
+- סריקת דרכון: העלה תמונה → לחץ "סרוק דרכון" → פרטים יתמלאו
+- סריקת טיסה: העלה צילום מסך → לחץ "סרוק טיסה" → פרטים יתמלאו
+- מלונות: הקלד שם → לחץ "חפש מלון" → פרטים יתמלאו
+- מפות אצטדיון מופיעות אוטומטית לפי הקבוצה
+
+ענה קצר וממוקד. אם לא יודע - הפנה לעמוד העזרה (כפתור ❓)."""
+
+# Each FAQ item: several phrasings of the question and one answer
+FAQ_ITEMS = [
+    {
+        'questions': ["העליתי דרכון ולא קורה כלום", "סריקת דרכון לא עובדת", "הדרכון לא נסרק"],
+        'answer': 'לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק דרכונים והוסף נוסעים"!'
+    },
+    {
+        'questions': ["העליתי צילום טיסה ולא קורה כלום", "סריקת טיסה לא עובדת", "צילום המסך של הטיסה לא נסרק"],
+        'answer': 'לאחר העלאת התמונה, חייבים ללחוץ על כפתור "🔍 סרוק פרטי טיסות"!'
+    },
+    {
+        'questions': ["איפה שער ההמרה?", "איך מעדכנים שער המרה", "מה שער היורו", "שער הדולר"],
+        'answer': "שער ההמרה מתעדכן אוטומטית (שער בנק ישראל + 5 אגורות). אין צורך להזין."
+    },
+    {
+        'questions': ["איך שולחים ללקוח?", "איך שולחים הזמנה ללקוח", "שליחת הזמנה ללקוח"],
+        'answer': 'לחץ "צור PDF והורד", ושלח את הקובץ ללקוח דרך וואטסאפ.'
+    },
+    {
+        'questions': ["למה אני לא רואה מפת אצטדיון?", "אין מפת אצטדיון", "איך מוסיפים מפת אצטדיון"],
+        'answer': 'לא לכל הקבוצות יש מפה במערכת. ניתן להעלות מפה ידנית או להשתמש בכלי "הורדת מפות".'
+    },
+    {
+        'questions': ["איך משנים סטטוס הזמנה?", "עדכון סטטוס הזמנה"],
+        'answer': "בהיסטוריית ההזמנות, לחץ על ההזמנה ובחר סטטוס חדש."
+    },
+    {
+        'questions': ["האם ניתן לערוך הזמנה קיימת?", "איך עורכים הזמנה", "לתקן הזמנה שנשלחה"],
+        'answer': "לא, אבל ניתן ליצור הזמנה חדשה ולבטל את הישנה."
+    },
+    {
+        'questions': ["מה לעשות אם ה-OCR לא מזהה נכון?", "הסריקה זיהתה פרטים לא נכונים", "הדרכון נסרק עם טעויות"],
+        'answer': "ודא שהתמונה ברורה. ניתן תמיד לתקן ידנית את הפרטים."
+    },
+    {
+        'questions': ["איך לשלוח הזמנה שוב?", "שליחה חוזרת של הזמנה"],
+        'answer': 'בהיסטוריית ההזמנות, לחץ על "שלח שוב" בהזמנה הרצויה.'
+    },
+    {
+        'questions': ["מה ההבדל בין חבילה מלאה לכרטיסים בלבד?", "מה זה חבילה מלאה", "מה כולל כרטיסים בלבד"],
+        'answer': '"חבילה מלאה" = מלון + טיסות + העברות + כרטיסים. "כרטיסים בלבד" = רק כרטיסים.'
+    },
+    {
+        'questions': ["איך מחפשים מלון?", "חיפוש מלון", "פרטי המלון לא מתמלאים"],
+        'answer': 'הקלד את שם המלון ולחץ "חפש מלון" - הכתובת, הדירוג, האתר והתמונות יתמלאו אוטומטית.'
+    },
+]
+
+# A question is answered from the FAQ when its best match scores at least this (0..1)
+FAQ_MIN_SCORE = 0.7
+
+# Questions that must NOT be answered from the FAQ (they share wording with an FAQ entry
+# but ask something else) - run `python chat_assistant.py` to check them
+FAQ_REGRESSION_CASES = [
+    "איך שולחים ללקוח במייל?",
+    "איך עורכים מלון",
+    "מה שער הדולר היום?",
+]
+ANSWER_CACHE_HOURS = 24
+MAX_CACHED_ANSWERS = 500
+
+_NIQQUD_RE = re.compile(r'[֑-ׇ]')
+_FINAL_LETTERS = str.maketrans({'ך': 'כ', 'ם': 'מ', 'ן': 'נ', 'ף': 'פ', 'ץ': 'צ'})
+_STOP_WORDS = {'את', 'של', 'על', 'זה', 'אני', 'יש', 'גם', 'או', 'עם', 'כל', 'לי', 'the', 'a', 'is'}
+# Words that carry no topic - they neither need an FAQ match nor count towards one
+_FILLER_WORDS = {'איך', 'מה', 'איפה', 'למה', 'האם', 'מתי', 'לא', 'שלי', 'אפשר', 'ניתן', 'צריך', 'רוצה', 'עושים', 'how', 'what'}
+
+_answer_cache = {}
+_answer_cache_lock = threading.Lock()
+_faq_index = None
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop niqqud, punctuation and stop words, unify final letters and strip a leading ו/ה"""
+    text = _NIQQUD_RE.sub('', text or '').lower().translate(_FINAL_LETTERS)
+    tokens = []
+    for token in re.findall(r'[\w]+', text):
+        if len(token) > 3 and token[0] in 'וה':
+            token = token[1:]
+        if token not in _STOP_WORDS:
+            tokens.append(token)
+    return ' '.join(tokens)
+
+
+_FILLER_WORD_SET = {normalize_question(word) for word in _FILLER_WORDS}
+
+
+def _content_words(normalized: str) -> list:
+    return [token for token in normalized.split() if token not in _FILLER_WORD_SET]
+
+
+def _word_matches(word: str, other: str) -> bool:
+    """Same word, or the same word with a one- or two-letter prefix/suffix (ללקוח / לקוח, מלונות / מלונ)"""
+    if word == other:
+        return True
+    shorter, longer = sorted((word, other), key=len)
+    return len(shorter) >= 3 and len(longer) - len(shorter) <= 2 and shorter in longer
+
+
+def _coverage(words: list, faq_words: list) -> float:
+    """Share of the question's content words that appear in the FAQ phrasing"""
+    if not words:
+        return 1.0
+    return sum(any(_word_matches(w, f) for f in faq_words) for w in words) / len(words)
+
+
+def _features(normalized: str) -> Counter:
+    """Word tokens plus character trigrams of each word (tolerates prefixes and inflections)"""
+    features = Counter()
+    for token in normalized.split():
+        features[f"w:{token}"] += 1
+        padded = f" {token} "
+        for i in range(len(padded) - 2):
+            features[padded[i:i + 3]] += 1
+    return features
+
+
+def _weighted(features: Counter, idf: dict) -> dict:
+    """TF-IDF weights; features unseen in the FAQ get the highest weight"""
+    default = max(idf.values()) if idf else 1.0
+    return {key: count * idf.get(key, default) for key, count in features.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(weight * b[key] for key, weight in a.items() if key in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def _get_faq_index() -> tuple:
+    """(idf, [(weighted features, content words, answer)]) for every FAQ phrasing, built on first use"""
+    global _faq_index
+    if _faq_index is None:
+        entries = [
+            (normalize_question(question), item['answer'])
+            for item in FAQ_ITEMS
+            for question in item['questions']
+        ]
+        entries = [(_features(normalized), _content_words(normalized), answer) for normalized, answer in entries]
+        # Words shared by many FAQ questions ("איך", "הזמנה") say little about which one is meant
+        document_counts = Counter(key for features, _, _ in entries for key in features)
+        idf = {key: math.log((1 + len(entries)) / (1 + count)) + 1 for key, count in document_counts.items()}
+        _faq_index = (idf, [(_weighted(features, idf), words, answer) for features, words, answer in entries])
+    return _faq_index
+
+
+def match_faq(question: str) -> tuple:
+    """
+    Find the closest FAQ answer. The similarity is scaled by the share of the question's
+    content words found in the FAQ phrasing, so an extra topic ("במייל", "היום") that the
+    FAQ answer doesn't address pulls the score below FAQ_MIN_SCORE.
+
+    Returns:
+        (answer, score) of the best match, or (None, 0.0) if the index is empty
+    """
+    idf, entries = _get_faq_index()
+    normalized = normalize_question(question)
+    features = _weighted(_features(normalized), idf)
+    words = _content_words(normalized)
+    best_answer, best_score = None, 0.0
+    for faq_features, faq_words, answer in entries:
+        score = _cosine(features, faq_features) * _coverage(words, faq_words)
+        if score > best_score:
+            best_answer, best_score = answer, score
+    return best_answer, best_score
+
+
+def get_cached_answer(question: str):
+    """LLM answer cached for the same normalized question, or None"""
+    key = normalize_question(question)
+    with _answer_cache_lock:
+        entry = _answer_cache.get(key)
+        if entry and time.time() - entry['timestamp'] < ANSWER_CACHE_HOURS * 3600:
+            return entry['answer']
+    return None
+
+
+def cache_answer(question: str, answer: str):
+    key = normalize_question(question)
+    if not key:
+        return
+    with _answer_cache_lock:
+        if len(_answer_cache) >= MAX_CACHED_ANSWERS and key not in _answer_cache:
+            oldest = min(_answer_cache, key=lambda k: _answer_cache[k]['timestamp'])
+            del _answer_cache[oldest]
+        _answer_cache[key] = {'answer': answer, 'timestamp': time.time()}
+
+
+def answer_question(question: str) -> tuple:
+    """
+    Answer from the FAQ or the answer cache without calling the model.
+
+    Returns:
+        (answer, source) with source 'faq' or 'cache', or (None, None) if the model is needed
+    """
+    answer, score = match_faq(question)
+    if answer and score >= FAQ_MIN_SCORE:
+        return answer, 'faq'
+    cached = get_cached_answer(question)
+    if cached:
+        return cached, 'cache'
+    return None, None
+
+
+def build_prompt(question: str) -> str:
+    return f"{SYSTEM_PROMPT}\n\nשאלת המשתמש: {question}"
+
+
+if __name__ == "__main__":
+    failures = 0
+    for item in FAQ_ITEMS:
+        for question in item['questions']:
+            answer, score = match_faq(question)
+            if answer != item['answer'] or score < FAQ_MIN_SCORE:
+                failures += 1
+                print(f"FAQ phrasing not matched: {question} ({score:.2f})")
+    for question in FAQ_REGRESSION_CASES:
+        answer, score = match_faq(question)
+        if score >= FAQ_MIN_SCORE:
+            failures += 1
+            print(f"Answered from FAQ but shouldn't be: {question} ({score:.2f}) -> {answer}")
+    print("FAQ check passed" if not failures else f"FAQ check: {failures} failure(s)")
+    raise SystemExit(1 if failures else 0)
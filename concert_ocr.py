@@ -3,24 +3,46 @@ Concert OCR using Gemini AI
 Extracts concert/event details from screenshots or web page images
 """
 
-import os
 import json
-import time
-from google import genai
 from google.genai import types
+from gemini_client import generate_content
+from ocr_image import prepare_ocr_image
+from ocr_cache import image_cache_key, get_cached_result, save_result
+from ocr_output import json_config, parse_json_response, coerce_to_schema
 
-AI_INTEGRATIONS_GEMINI_API_KEY = os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY")
-AI_INTEGRATIONS_GEMINI_BASE_URL = os.environ.get("AI_INTEGRATIONS_GEMINI_BASE_URL")
+# Included in the OCR cache key; change it with the prompt or returned fields
+PROMPT_VERSION = 2
 
-def get_client():
-    """Create a new client instance to avoid stale connections"""
-    return genai.Client(
-        api_key=AI_INTEGRATIONS_GEMINI_API_KEY,
-        http_options={
-            'api_version': '',
-            'base_url': AI_INTEGRATIONS_GEMINI_BASE_URL   
-        }
-    )
+# Declared to Gemini as the response schema; parsed output is coerced to it
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'artist_name': {'type': 'STRING'},
+        'event_name': {'type': 'STRING'},
+        'event_date': {'type': 'STRING', 'description': 'DD/MM/YYYY'},
+        'event_time': {'type': 'STRING', 'description': 'HH:MM'},
+        'doors_open': {'type': 'STRING'},
+        'venue_name': {'type': 'STRING'},
+        'venue_city': {'type': 'STRING'},
+        'venue_country': {'type': 'STRING'},
+        'categories': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'name': {'type': 'STRING'},
+                    'price': {'type': 'STRING'},
+                    'description': {'type': 'STRING'},
+                },
+                'required': ['name'],
+            },
+        },
+        'min_price': {'type': 'STRING'},
+        'currency': {'type': 'STRING'},
+        'notes': {'type': 'STRING'},
+    },
+    'required': ['artist_name', 'event_name', 'event_date', 'venue_name', 'categories'],
+}
 
 def extract_concert_data(image_bytes: bytes, max_retries: int = 3) -> dict:
     """
@@ -28,7 +50,7 @@ def extract_concert_data(image_bytes: bytes, max_retries: int = 3) -> dict:
     
     Args:
         image_bytes: The event page screenshot as bytes
-        max_retries: Number of retry attempts for network errors
+        max_retries: Total Gemini attempts for transient errors (timeouts, 429, 5xx, connection drops)
         
     Returns:
         Dictionary with extracted concert data:
@@ -74,101 +96,79 @@ Rules:
 - For categories array, include all visible ticket types
 - Return ONLY the JSON object, nothing else."""
 
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            client = get_client()
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    prompt,
-                    types.Part(
-                        inline_data=types.Blob(
-                            mime_type="image/jpeg",
-                            data=image_bytes
-                        )
-                    )
-                ]
-            )
-            
-            result_text = response.text.strip()
-            
-            if result_text.startswith("```"):
-                lines = result_text.split('\n')
-                result_text = '\n'.join(lines[1:-1])
-            
-            data = json.loads(result_text)
-            
-            return {
-                "success": True,
-                "error": None,
-                "artist_name": data.get("artist_name", ""),
-                "event_name": data.get("event_name", ""),
-                "event_date": data.get("event_date", ""),
-                "event_time": data.get("event_time", ""),
-                "doors_open": data.get("doors_open", ""),
-                "venue_name": data.get("venue_name", ""),
-                "venue_city": data.get("venue_city", ""),
-                "venue_country": data.get("venue_country", ""),
-                "categories": data.get("categories", []),
-                "min_price": data.get("min_price", ""),
-                "currency": data.get("currency", "EUR"),
-                "notes": data.get("notes", "")
-            }
-            
-        except json.JSONDecodeError as e:
-            return {
-                "success": False,
-                "error": f"Could not parse response: {str(e)}",
-                "artist_name": "",
-                "event_name": "",
-                "event_date": "",
-                "event_time": "",
-                "doors_open": "",
-                "venue_name": "",
-                "venue_city": "",
-                "venue_country": "",
-                "categories": [],
-                "min_price": "",
-                "currency": "EUR",
-                "notes": ""
-            }
-        except Exception as e:
-            last_error = str(e)
-            if "Connection refused" in last_error or "111" in last_error:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-            return {
-                "success": False,
-                "error": last_error,
-                "artist_name": "",
-                "event_name": "",
-                "event_date": "",
-                "event_time": "",
-                "doors_open": "",
-                "venue_name": "",
-                "venue_city": "",
-                "venue_country": "",
-                "categories": [],
-                "min_price": "",
-                "currency": "EUR",
-                "notes": ""
-            }
+    image_bytes, mime_type = prepare_ocr_image(image_bytes)
+    cache_key = image_cache_key('concert', PROMPT_VERSION, image_bytes)
+    cached = get_cached_result('concert', cache_key)
+    if cached:
+        return cached
     
-    return {
-        "success": False,
-        "error": f"Failed after {max_retries} attempts: {last_error}",
-        "artist_name": "",
-        "event_name": "",
-        "event_date": "",
-        "event_time": "",
-        "doors_open": "",
-        "venue_name": "",
-        "venue_city": "",
-        "venue_country": "",
-        "categories": [],
-        "min_price": "",
-        "currency": "EUR",
-        "notes": ""
-    }
+    try:
+        response = generate_content(
+            contents=[
+                prompt,
+                types.Part(
+                    inline_data=types.Blob(
+                        mime_type=mime_type,
+                        data=image_bytes
+                    )
+                )
+            ],
+            config=json_config(RESPONSE_SCHEMA),
+            max_attempts=max_retries
+        )
+        
+        data = coerce_to_schema(parse_json_response(response.text), RESPONSE_SCHEMA)
+        
+        result = {
+            "success": True,
+            "error": None,
+            "artist_name": data.get("artist_name", ""),
+            "event_name": data.get("event_name", ""),
+            "event_date": data.get("event_date", ""),
+            "event_time": data.get("event_time", ""),
+            "doors_open": data.get("doors_open", ""),
+            "venue_name": data.get("venue_name", ""),
+            "venue_city": data.get("venue_city", ""),
+            "venue_country": data.get("venue_country", ""),
+            "categories": data.get("categories", []),
+            "min_price": data.get("min_price", ""),
+            "currency": data.get("currency") or "EUR",
+            "notes": data.get("notes", "")
+        }
+        save_result('concert', cache_key, result)
+        return result
+        
+    except json.JSONDecodeError as e:
+        return {
+            "success": False,
+            "error": f"Could not parse response: {str(e)}",
+            "artist_name": "",
+            "event_name": "",
+            "event_date": "",
+            "event_time": "",
+            "doors_open": "",
+            "venue_name": "",
+            "venue_city": "",
+            "venue_country": "",
+            "categories": [],
+            "min_price": "",
+            "currency": "EUR",
+            "notes": ""
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "artist_name": "",
+            "event_name": "",
+            "event_date": "",
+            "event_time": "",
+            "doors_open": "",
+            "venue_name": "",
+            "venue_city": "",
+            "venue_country": "",
+            "categories": [],
+            "min_price": "",
+            "currency": "EUR",
+            "notes": ""
+        }
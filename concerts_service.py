@@ -8,9 +8,16 @@ import os
 import requests
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
+import copy
+import hashlib
+from collections import OrderedDict
+import io
 import json
 import re
+import threading
+import time
 from bs4 import BeautifulSoup
+import rate_limiter
 
 TICKETMASTER_API_KEY = os.environ.get('TICKETMASTER_API_KEY', '')
 RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY', '')
@@ -20,19 +27,53 @@ RAPIDAPI_HOST = "real-time-events-search.p.rapidapi.com"
 _cache = {}
 CACHE_DURATION_HOURS = 24
 
+# Background refresh of the shared concert cache
+REFRESH_AHEAD_HOURS = 3
+REFRESH_INTERVAL_MINUTES = 30
+MAX_REFRESHES_PER_CYCLE = 4
+RECENT_SEARCH_DAYS = 7
+REFRESH_RESULT_SIZE = 50
+REFRESH_MIN_BUDGET = 0.3
 
-def _get_db_cache(cache_key: str) -> Optional[Dict]:
-    """Get cached concert results from database"""
+# Venue maps scraped from Ticketmaster event pages
+VENUE_MAPS_DIR = 'attached_assets/concert_venue_maps'
+VENUE_MAP_INDEX = f'{VENUE_MAPS_DIR}/scraped_index.json'
+VENUE_MAP_CACHE_DAYS = 30
+VENUE_MAP_MISS_HOURS = 6
+VENUE_MAP_TAGS = ('img', 'div', 'a', 'source')
+VENUE_MAP_ATTRS = ['src', 'data-src', 'href', 'srcset', 'data-lazy-src', 'data-original']
+
+# Concert details extracted from event page URLs
+URL_CACHE_HOURS = 6
+URL_TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'referrer', 'affiliate'}
+# In-process LRU in front of ConcertUrlCache; expired entries stay for conditional revalidation
+MAX_URL_CACHE_ENTRIES = 200
+_url_cache = OrderedDict()
+_url_cache_lock = threading.Lock()
+
+_refresh_lock = threading.Lock()
+_refreshing_keys = set()
+_refresher_started = False
+
+
+def _get_db_cache(cache_key: str, allow_stale: bool = False) -> Optional[Dict]:
+    """Get cached concert results from database.
+    
+    With allow_stale=True an expired row is still returned (marked 'stale') so the
+    caller can serve it while a background refresh fetches fresh data.
+    Every hit is counted so the refresher knows which artists are searched most.
+    """
     try:
         from models import get_db, ConcertCache
         db = get_db()
         if not db:
             return None
         
-        cached = db.query(ConcertCache).filter(
-            ConcertCache.cache_key == cache_key,
-            ConcertCache.expires_at > datetime.utcnow()
-        ).first()
+        now = datetime.utcnow()
+        query = db.query(ConcertCache).filter(ConcertCache.cache_key == cache_key)
+        if not allow_stale:
+            query = query.filter(ConcertCache.expires_at > now)
+        cached = query.first()
         
         if cached:
             result = {
@@ -42,8 +83,12 @@ def _get_db_cache(cache_key: str) -> Optional[Dict]:
                 'artist_name': cached.artist_name,
                 'source': cached.source,
                 'from_cache': True,
+                'stale': bool(cached.expires_at and cached.expires_at <= now),
                 'error': None
             }
+            cached.hit_count = (cached.hit_count or 0) + 1
+            cached.last_accessed_at = now
+            db.commit()
             db.close()
             return result
         
@@ -83,7 +128,8 @@ def _set_db_cache(cache_key: str, data: Dict, artist_id: str = '', artist_name:
                 concerts_json=concerts_json,
                 total_results=data.get('total', 0),
                 source=source,
-                expires_at=expires_at
+                expires_at=expires_at,
+                last_accessed_at=datetime.utcnow()
             )
             db.add(new_cache)
         
@@ -128,6 +174,24 @@ def _get_cache_key(prefix: str, key: str) -> str:
     return f"{prefix}_{key.lower()}"
 
 
+def _rate_limited_result(cache_key: str, empty: Dict) -> Dict:
+    """Serve cached data of any age when the provider's request budget is exhausted"""
+    entry = _cache.get(cache_key)
+    if entry and not entry['data'].get('error'):
+        return {**entry['data'], 'rate_limited': True}
+    return {**empty, 'error': 'Rate limit exceeded', 'rate_limited': True}
+
+
+def _report_429(provider: str, response):
+    """Tell the shared rate limiter that the provider rejected us"""
+    retry_after = None
+    try:
+        retry_after = float(response.headers.get('Retry-After', ''))
+    except (TypeError, ValueError):
+        pass
+    rate_limiter.report_rate_limited(provider, retry_after)
+
+
 def _is_cache_valid(cache_key: str) -> bool:
     """Check if cached data is still valid"""
     if cache_key not in _cache:
@@ -162,6 +226,9 @@ def search_artists(query: str, size: int = 10) -> Dict:
         if not cached.get('error'):
             return cached
     
+    if not rate_limiter.acquire('ticketmaster'):
+        return _rate_limited_result(cache_key, {'artists': []})
+    
     try:
         params = {
             'apikey': TICKETMASTER_API_KEY,
@@ -178,7 +245,8 @@ def search_artists(query: str, size: int = 10) -> Dict:
         )
         
         if response.status_code == 429:
-            return {'error': 'Rate limit exceeded', 'artists': []}
+            _report_429('ticketmaster', response)
+            return _rate_limited_result(cache_key, {'artists': []})
         
         response.raise_for_status()
         data = response.json()
@@ -257,7 +325,7 @@ def _parse_attraction(attraction: dict) -> Optional[Dict]:
         return None
 
 
-def get_events_by_attraction_id(attraction_id: str, artist_name: str = '', size: int = 50, europe_only: bool = True) -> Dict:
+def get_events_by_attraction_id(attraction_id: str, artist_name: str = '', size: int = 50, europe_only: bool = True, force_refresh: bool = False) -> Dict:
     """
     Fetch events for a specific artist using their Ticketmaster Attraction ID.
     This ensures 100% accuracy - only events featuring this exact artist.
@@ -267,6 +335,7 @@ def get_events_by_attraction_id(attraction_id: str, artist_name: str = '', size:
         artist_name: Artist name for display
         size: Max number of results
         europe_only: Filter for European venues only
+        force_refresh: Skip the in-memory cache and always call the API
     
     Returns:
         Dict with 'concerts' list and 'total' count
@@ -278,11 +347,14 @@ def get_events_by_attraction_id(attraction_id: str, artist_name: str = '', size:
         return {'error': 'Attraction ID required', 'concerts': [], 'total': 0}
     
     cache_key = _get_cache_key('events', f"{attraction_id}_{europe_only}")
-    if _is_cache_valid(cache_key):
+    if not force_refresh and _is_cache_valid(cache_key):
         cached = _cache[cache_key]['data']
         if not cached.get('error'):
             return cached
     
+    if not rate_limiter.acquire('ticketmaster'):
+        return _rate_limited_result(cache_key, {'concerts': [], 'total': 0})
+    
     try:
         params = {
             'apikey': TICKETMASTER_API_KEY,
@@ -299,7 +371,8 @@ def get_events_by_attraction_id(attraction_id: str, artist_name: str = '', size:
         )
         
         if response.status_code == 429:
-            return {'error': 'Rate limit exceeded', 'concerts': [], 'total': 0}
+            _report_429('ticketmaster', response)
+            return _rate_limited_result(cache_key, {'concerts': [], 'total': 0})
         
         response.raise_for_status()
         data = response.json()
@@ -448,6 +521,9 @@ def get_popular_artists_with_events(size: int = 20) -> Dict:
         if not cached.get('error'):
             return cached
     
+    if not rate_limiter.acquire('ticketmaster'):
+        return _rate_limited_result(cache_key, {'artists': []})
+    
     try:
         params = {
             'apikey': TICKETMASTER_API_KEY,
@@ -463,7 +539,8 @@ def get_popular_artists_with_events(size: int = 20) -> Dict:
         )
         
         if response.status_code == 429:
-            return {'error': 'Rate limit exceeded', 'artists': []}
+            _report_429('ticketmaster', response)
+            return _rate_limited_result(cache_key, {'artists': []})
         
         response.raise_for_status()
         data = response.json()
@@ -522,26 +599,111 @@ def clear_cache():
     _cache = {}
 
 
+def _load_venue_map_index() -> Dict:
+    """Load the scraped venue map index (venue_id -> path, fetched_at)"""
+    try:
+        with open(VENUE_MAP_INDEX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_venue_map_index(venue_id: str, path: Optional[str]):
+    """Record a scrape result (path=None for a miss); written atomically so processes can share it"""
+    index = _load_venue_map_index()
+    index[venue_id] = {'path': path, 'fetched_at': datetime.utcnow().isoformat()}
+    tmp_path = f"{VENUE_MAP_INDEX}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, VENUE_MAP_INDEX)
+    except OSError as e:
+        print(f"Venue map index write error: {e}")
+
+
+def _find_map_image_url(page_content: bytes) -> Optional[str]:
+    """
+    Find the seatmap image URL in an event page.
+    Streams the HTML through lxml, building only img/div/a/source elements and
+    discarding each one after it is checked, and stops at the first tmimages
+    venue/map URL. An img whose alt text looks like a seat map is used otherwise.
+    """
+    from lxml import etree
+    
+    alt_match = None
+    try:
+        for _, element in etree.iterparse(io.BytesIO(page_content), events=('end',), tag=VENUE_MAP_TAGS, html=True, recover=True):
+            for attr in VENUE_MAP_ATTRS:
+                attr_val = element.get(attr) or ''
+                attr_lower = attr_val.lower()
+                if 'tmimages' in attr_lower and ('venue' in attr_lower or 'map' in attr_lower):
+                    return attr_val.split(' ')[0]
+            
+            if alt_match is None and element.tag == 'img':
+                alt = (element.get('alt') or '').lower()
+                if any(kw in alt for kw in ['venue map', 'seating', 'seat map', 'floor plan', 'seatmap']):
+                    alt_match = element.get('src') or element.get('data-src') or element.get('data-lazy-src')
+            
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except etree.LxmlError as e:
+        print(f"Venue map parse error: {e}")
+    
+    if alt_match:
+        return alt_match
+    
+    page_text = page_content.decode('utf-8', errors='ignore')
+    patterns = [
+        r'https?://[^"\'\s<>]+tmimages[^"\'\s<>]+maps?[^"\'\s<>]+\.(gif|png|jpg|jpeg)',
+        r'https?://[^"\'\s<>]+seatmap[^"\'\s<>]+\.(gif|png|jpg|jpeg)',
+    ]
+    for pattern in patterns:
+        full_match = re.search(pattern, page_text, re.IGNORECASE)
+        if full_match:
+            return full_match.group(0)
+    
+    return None
+
+
 def fetch_venue_map_from_ticketmaster(event_url: str, venue_id: str) -> Optional[str]:
     """
     Extract venue map image from Ticketmaster event page.
     Saves the image to attached_assets/concert_venue_maps/{venue_id}.ext
     
+    Results are cached on disk per venue: a scraped map is reused for
+    VENUE_MAP_CACHE_DAYS and a failed lookup is not retried for
+    VENUE_MAP_MISS_HOURS, so a venue that was already resolved returns
+    without network traffic. Manually uploaded maps never expire.
+    
     Note: Ticketmaster uses bot protection, so this has limited success.
     Manual upload is the more reliable method.
     """
     if not event_url or not venue_id:
         return None
     
+    existing_path = None
+    for ext in ['png', 'jpg', 'jpeg', 'gif', 'webp']:
+        path = f'{VENUE_MAPS_DIR}/{venue_id}.{ext}'
+        if os.path.exists(path):
+            existing_path = path
+            break
+    
+    entry = _load_venue_map_index().get(venue_id)
+    if existing_path and not entry:
+        # Uploaded by an agent, not scraped
+        return existing_path
+    if entry:
+        try:
+            age = datetime.utcnow() - datetime.fromisoformat(entry.get('fetched_at', ''))
+        except ValueError:
+            age = timedelta.max
+        ttl = timedelta(days=VENUE_MAP_CACHE_DAYS) if entry.get('path') else timedelta(hours=VENUE_MAP_MISS_HOURS)
+        if age < ttl and (existing_path or not entry.get('path')):
+            return existing_path
+    
     try:
-        os.makedirs('attached_assets/concert_venue_maps', exist_ok=True)
-        
-        for ext in ['png', 'jpg', 'jpeg', 'gif', 'webp']:
-            existing_path = f'attached_assets/concert_venue_maps/{venue_id}.{ext}'
-            if os.path.exists(existing_path):
-                return existing_path
-        
-        output_path = f'attached_assets/concert_venue_maps/{venue_id}.png'
+        os.makedirs(VENUE_MAPS_DIR, exist_ok=True)
         
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -551,41 +713,10 @@ def fetch_venue_map_from_ticketmaster(event_url: str, venue_id: str) -> Optional
         
         response = requests.get(event_url, headers=headers, timeout=20)
         if response.status_code != 200:
-            return None
-        
-        soup = BeautifulSoup(response.text, 'lxml')
+            _update_venue_map_index(venue_id, None)
+            return existing_path
         
-        map_img_url = None
-        
-        for tag in soup.find_all(['img', 'div', 'a', 'source']):
-            for attr in ['src', 'data-src', 'href', 'srcset', 'data-lazy-src', 'data-original']:
-                attr_val = tag.get(attr, '')
-                if attr_val and 'tmimages' in str(attr_val).lower() and ('venue' in str(attr_val).lower() or 'map' in str(attr_val).lower()):
-                    map_img_url = str(attr_val).split(' ')[0]
-                    break
-            if map_img_url:
-                break
-        
-        if not map_img_url:
-            for img in soup.find_all('img'):
-                alt = str(img.get('alt', '')).lower()
-                if any(kw in alt for kw in ['venue map', 'seating', 'seat map', 'floor plan', 'seatmap']):
-                    src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                    if src:
-                        map_img_url = str(src)
-                        break
-        
-        if not map_img_url:
-            page_text = response.text
-            patterns = [
-                r'https?://[^"\'\s<>]+tmimages[^"\'\s<>]+maps?[^"\'\s<>]+\.(gif|png|jpg|jpeg)',
-                r'https?://[^"\'\s<>]+seatmap[^"\'\s<>]+\.(gif|png|jpg|jpeg)',
-            ]
-            for pattern in patterns:
-                full_match = re.search(pattern, page_text, re.IGNORECASE)
-                if full_match:
-                    map_img_url = full_match.group(0)
-                    break
+        map_img_url = _find_map_image_url(response.content)
         
         if map_img_url:
             if not map_img_url.startswith('http'):
@@ -595,29 +726,37 @@ def fetch_venue_map_from_ticketmaster(event_url: str, venue_id: str) -> Optional
                     from urllib.parse import urljoin
                     map_img_url = urljoin(event_url, map_img_url)
             
-            img_response = requests.get(map_img_url, headers=headers, timeout=15)
-            if img_response.status_code == 200:
-                ext = 'png'
-                if '.gif' in map_img_url.lower():
-                    ext = 'gif'
-                elif '.jpg' in map_img_url.lower() or '.jpeg' in map_img_url.lower():
-                    ext = 'jpg'
-                content_type = img_response.headers.get('content-type', '')
-                if 'gif' in content_type:
-                    ext = 'gif'
-                elif 'jpeg' in content_type or 'jpg' in content_type:
-                    ext = 'jpg'
-                
-                save_path = f'attached_assets/concert_venue_maps/{venue_id}.{ext}'
-                with open(save_path, 'wb') as f:
-                    f.write(img_response.content)
-                return save_path
-        
-        return None
+            with requests.get(map_img_url, headers=headers, timeout=15, stream=True) as img_response:
+                if img_response.status_code == 200:
+                    ext = 'png'
+                    if '.gif' in map_img_url.lower():
+                        ext = 'gif'
+                    elif '.jpg' in map_img_url.lower() or '.jpeg' in map_img_url.lower():
+                        ext = 'jpg'
+                    content_type = img_response.headers.get('content-type', '')
+                    if 'gif' in content_type:
+                        ext = 'gif'
+                    elif 'jpeg' in content_type or 'jpg' in content_type:
+                        ext = 'jpg'
+                    
+                    save_path = f'{VENUE_MAPS_DIR}/{venue_id}.{ext}'
+                    tmp_path = f"{save_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in img_response.iter_content(chunk_size=64 * 1024):
+                            f.write(chunk)
+                    os.replace(tmp_path, save_path)
+                    if existing_path and existing_path != save_path:
+                        os.remove(existing_path)
+                    _update_venue_map_index(venue_id, save_path)
+                    return save_path
+        
+        _update_venue_map_index(venue_id, None)
+        return existing_path
     
     except Exception as e:
         print(f"Error fetching venue map: {e}")
-        return None
+        _update_venue_map_index(venue_id, None)
+        return existing_path
 
 
 def is_ticketmaster_url(url: str) -> bool:
@@ -633,7 +772,7 @@ def is_ticketmaster_url(url: str) -> bool:
     return any(domain in url.lower() for domain in tm_domains)
 
 
-def search_events_rapidapi(query: str, size: int = 20) -> Dict:
+def search_events_rapidapi(query: str, size: int = 20, force_refresh: bool = False) -> Dict:
     """
     Search for concerts/events using RapidAPI Real-Time Events Search.
     This API aggregates from multiple sources including regional Ticketmaster sites,
@@ -642,6 +781,7 @@ def search_events_rapidapi(query: str, size: int = 20) -> Dict:
     Args:
         query: Search query (artist name, location, etc.)
         size: Max number of results
+        force_refresh: Skip the in-memory cache and always call the API
     
     Returns:
         Dict with 'concerts' list and metadata
@@ -653,11 +793,14 @@ def search_events_rapidapi(query: str, size: int = 20) -> Dict:
         return {'error': 'Query too short', 'concerts': [], 'total': 0}
     
     cache_key = _get_cache_key('rapidapi_events', query)
-    if _is_cache_valid(cache_key):
+    if not force_refresh and _is_cache_valid(cache_key):
         cached = _cache[cache_key]['data']
         if not cached.get('error'):
             return cached
     
+    if not rate_limiter.acquire('rapidapi'):
+        return _rate_limited_result(cache_key, {'concerts': [], 'total': 0})
+    
     try:
         headers = {
             'X-RapidAPI-Key': RAPIDAPI_KEY,
@@ -672,7 +815,8 @@ def search_events_rapidapi(query: str, size: int = 20) -> Dict:
         )
         
         if response.status_code == 429:
-            return {'error': 'Rate limit exceeded', 'concerts': [], 'total': 0}
+            _report_429('rapidapi', response)
+            return _rate_limited_result(cache_key, {'concerts': [], 'total': 0})
         
         if response.status_code == 403:
             return {'error': 'API subscription required', 'concerts': [], 'total': 0}
@@ -798,33 +942,42 @@ def _parse_rapidapi_event(event: dict, search_query: str) -> Optional[Dict]:
         return None
 
 
-def search_events_combined(artist_name: str, attraction_id: str = '', size: int = 30) -> Dict:
+def search_events_combined(artist_name: str, attraction_id: str = '', size: int = 30, force_refresh: bool = False) -> Dict:
     """
     Search for events using both Ticketmaster and RapidAPI, combining results.
     This provides the most comprehensive coverage.
     Uses database caching to share results across all users.
+    Expired cache entries are served immediately while a background refresh runs.
     
     Args:
         artist_name: Artist name to search for
         attraction_id: Ticketmaster attraction ID (optional, for more accurate TM results)
         size: Max total results
+        force_refresh: Ignore all caches and fetch from the APIs (used by the refresher)
     
     Returns:
         Dict with combined 'concerts' list from both sources
     """
-    cache_key = f"combined_{artist_name.lower()}_{attraction_id}"
+    cache_key = _get_combined_cache_key(artist_name, attraction_id)
     
-    cached_result = _get_db_cache(cache_key)
-    if cached_result:
-        print(f"Using cached results for {artist_name}")
-        return cached_result
+    if not force_refresh:
+        cached_result = _get_db_cache(cache_key, allow_stale=True)
+        if cached_result:
+            if cached_result.get('stale'):
+                print(f"Serving stale results for {artist_name}, refreshing in background")
+                schedule_cache_refresh(artist_name, attraction_id)
+            else:
+                print(f"Using cached results for {artist_name}")
+            return cached_result
     
     all_concerts = []
     seen_events = set()
     errors = []
+    rate_limited = False
     
     if attraction_id and TICKETMASTER_API_KEY:
-        tm_result = get_events_by_attraction_id(attraction_id, artist_name, size=size//2)
+        tm_result = get_events_by_attraction_id(attraction_id, artist_name, size=size//2, force_refresh=force_refresh)
+        rate_limited = rate_limited or tm_result.get('rate_limited', False)
         if tm_result.get('error'):
             errors.append(f"Ticketmaster: {tm_result['error']}")
         for concert in tm_result.get('concerts', []):
@@ -844,7 +997,8 @@ def search_events_combined(artist_name: str, attraction_id: str = '', size: int
         artist_lower = artist_name.lower()
         
         for query in search_queries:
-            rapid_result = search_events_rapidapi(query, size=size//2)
+            rapid_result = search_events_rapidapi(query, size=size//2, force_refresh=force_refresh)
+            rate_limited = rate_limited or rapid_result.get('rate_limited', False)
             if rapid_result.get('error'):
                 if rapid_result['error'] not in [e for e in errors]:
                     errors.append(f"RapidAPI: {rapid_result['error']}")
@@ -875,12 +1029,149 @@ def search_events_combined(artist_name: str, attraction_id: str = '', size: int
         'error': None
     }
     
-    if all_concerts:
+    # Partial results from a throttled provider must not replace a complete cache entry
+    if all_concerts and not rate_limited:
         _set_db_cache(cache_key, result, artist_id=attraction_id, artist_name=artist_name, source='combined')
     
     return result
 
 
+def _get_combined_cache_key(artist_name: str, attraction_id: str = '') -> str:
+    """Database cache key used by search_events_combined"""
+    return f"combined_{artist_name.lower()}_{attraction_id}"
+
+
+def _refresh_combined(artist_name: str, attraction_id: str = ''):
+    """Re-fetch one artist from the APIs and rewrite its database cache row"""
+    cache_key = _get_combined_cache_key(artist_name, attraction_id)
+    try:
+        search_events_combined(artist_name, attraction_id, size=REFRESH_RESULT_SIZE, force_refresh=True)
+    except Exception as e:
+        print(f"Cache refresh error for {artist_name}: {e}")
+    finally:
+        with _refresh_lock:
+            _refreshing_keys.discard(cache_key)
+
+
+def schedule_cache_refresh(artist_name: str, attraction_id: str = '') -> bool:
+    """
+    Refresh an artist's cached concerts in a background thread.
+    Does nothing if a refresh for the same artist is already running.
+    
+    Returns:
+        True if a refresh was started
+    """
+    cache_key = _get_combined_cache_key(artist_name, attraction_id)
+    with _refresh_lock:
+        if cache_key in _refreshing_keys:
+            return False
+        _refreshing_keys.add(cache_key)
+    
+    threading.Thread(
+        target=_refresh_combined,
+        args=(artist_name, attraction_id),
+        daemon=True
+    ).start()
+    return True
+
+
+def _get_refresh_candidates(limit: int) -> List[Dict]:
+    """
+    Pick the artists whose cache should be refreshed next.
+    Popular artists that were never cached come first, then cached artists that
+    expire within REFRESH_AHEAD_HOURS and are popular or were searched recently,
+    most searched first.
+    """
+    try:
+        from models import get_db, ConcertCache
+        db = get_db()
+        if not db:
+            return []
+        
+        now = datetime.utcnow()
+        popular_ids = [a['id'] for a in POPULAR_ARTISTS]
+        rows = db.query(ConcertCache).filter(
+            ConcertCache.cache_key.like('combined_%'),
+            ConcertCache.expires_at < now + timedelta(hours=REFRESH_AHEAD_HOURS),
+            (ConcertCache.last_accessed_at > now - timedelta(days=RECENT_SEARCH_DAYS)) |
+            ConcertCache.artist_id.in_(popular_ids)
+        ).order_by(ConcertCache.hit_count.desc().nulls_last()).limit(limit).all()
+        cached_keys = {k for (k,) in db.query(ConcertCache.cache_key).filter(
+            ConcertCache.cache_key.like('combined_%')
+        ).all()}
+        db.close()
+    except Exception as e:
+        print(f"Cache refresh lookup error: {e}")
+        return []
+    
+    candidates = []
+    for artist in POPULAR_ARTISTS:
+        if _get_combined_cache_key(artist['name_en'], artist['id']) not in cached_keys:
+            candidates.append({'artist_name': artist['name_en'], 'attraction_id': artist['id']})
+    for row in rows:
+        candidates.append({'artist_name': row.artist_name or '', 'attraction_id': row.artist_id or ''})
+    
+    return [c for c in candidates if c['artist_name']][:limit]
+
+
+def refresh_concert_cache(max_refreshes: int = MAX_REFRESHES_PER_CYCLE) -> int:
+    """
+    Run one refresh cycle: re-fetch the most wanted artists before their cache expires.
+    max_refreshes caps the API calls per cycle (each refresh costs one Ticketmaster
+    and three RapidAPI requests), and refreshing stops once any provider's budget
+    falls below REFRESH_MIN_BUDGET, to stay within provider quotas.
+    
+    Returns:
+        Number of artists refreshed
+    """
+    refreshed = 0
+    for candidate in _get_refresh_candidates(max_refreshes):
+        # Leave the remaining quota to agents searching interactively
+        if not all(rate_limiter.has_budget(p, REFRESH_MIN_BUDGET) for p in ('ticketmaster', 'rapidapi')):
+            print("Concert cache refresher: provider budget low, skipping refresh")
+            break
+        cache_key = _get_combined_cache_key(candidate['artist_name'], candidate['attraction_id'])
+        with _refresh_lock:
+            if cache_key in _refreshing_keys:
+                continue
+            _refreshing_keys.add(cache_key)
+        _refresh_combined(candidate['artist_name'], candidate['attraction_id'])
+        refreshed += 1
+    return refreshed
+
+
+def _refresh_loop():
+    """Background loop that keeps the concert cache warm"""
+    while True:
+        try:
+            count = refresh_concert_cache()
+            if count:
+                print(f"Concert cache refresher: refreshed {count} artists")
+        except Exception as e:
+            print(f"Concert cache refresher error: {e}")
+        time.sleep(REFRESH_INTERVAL_MINUTES * 60)
+
+
+def start_cache_refresher() -> bool:
+    """
+    Start the background concert cache refresher (once per process).
+    Safe to call on every Streamlit rerun.
+    
+    Returns:
+        True if the refresher thread is running
+    """
+    global _refresher_started
+    if not (TICKETMASTER_API_KEY or RAPIDAPI_KEY):
+        return False
+    with _refresh_lock:
+        if _refresher_started:
+            return True
+        _refresher_started = True
+    
+    threading.Thread(target=_refresh_loop, name='concert-cache-refresher', daemon=True).start()
+    return True
+
+
 def search_concerts_by_location(location: str, artist_name: str = '', size: int = 20) -> Dict:
     """
     Search for concerts in a specific location using RapidAPI.
@@ -901,11 +1192,279 @@ def search_concerts_by_location(location: str, artist_name: str = '', size: int
     return search_events_rapidapi(query, size)
 
 
+def _parse_concert_page(html: str, url: str) -> Dict:
+    """Parse concert details out of an event page's HTML"""
+    soup = BeautifulSoup(html, 'lxml')
+    
+    concert = {
+        'name': '',
+        'artist': '',
+        'date': '',
+        'time': '',
+        'venue': '',
+        'city': '',
+        'country': '',
+        'address': '',
+        'url': url,
+        'source': _get_url_source(url)
+    }
+    
+    og_title = soup.find('meta', property='og:title')
+    if og_title:
+        concert['name'] = og_title.get('content', '')
+    
+    if not concert['name']:
+        title_tag = soup.find('title')
+        if title_tag:
+            concert['name'] = title_tag.get_text().strip()
+    
+    for tag in soup.find_all('script', type='application/ld+json'):
+        try:
+            ld_data = json.loads(tag.string)
+            if isinstance(ld_data, list):
+                ld_data = ld_data[0]
+            
+            if ld_data.get('@type') in ['Event', 'MusicEvent', 'Festival']:
+                concert['name'] = ld_data.get('name', concert['name'])
+                
+                start_date = ld_data.get('startDate', '')
+                if start_date:
+                    if 'T' in start_date:
+                        parts = start_date.split('T')
+                        concert['date'] = parts[0]
+                        if len(parts) > 1:
+                            time_part = parts[1].split('+')[0].split('-')[0][:5]
+                            concert['time'] = time_part
+                    else:
+                        concert['date'] = start_date[:10]
+                
+                location = ld_data.get('location', {})
+                if isinstance(location, dict):
+                    concert['venue'] = location.get('name', '')
+                    address = location.get('address', {})
+                    if isinstance(address, dict):
+                        concert['city'] = address.get('addressLocality', '')
+                        concert['country'] = address.get('addressCountry', '')
+                        concert['address'] = address.get('streetAddress', '')
+                    elif isinstance(address, str):
+                        concert['address'] = address
+                
+                performers = ld_data.get('performer', [])
+                if performers:
+                    if isinstance(performers, list) and len(performers) > 0:
+                        concert['artist'] = performers[0].get('name', '')
+                    elif isinstance(performers, dict):
+                        concert['artist'] = performers.get('name', '')
+                
+                break
+        except:
+            continue
+    
+    if not concert['venue']:
+        venue_patterns = [
+            soup.find(class_=re.compile(r'venue', re.I)),
+            soup.find(attrs={'data-venue': True}),
+            soup.find('span', class_=re.compile(r'location', re.I)),
+        ]
+        for v in venue_patterns:
+            if v:
+                text = v.get_text().strip()
+                if text and len(text) < 200:
+                    concert['venue'] = text
+                    break
+    
+    if not concert['date']:
+        date_patterns = [
+            soup.find(class_=re.compile(r'date', re.I)),
+            soup.find('time'),
+            soup.find(attrs={'datetime': True}),
+        ]
+        for d in date_patterns:
+            if d:
+                dt = d.get('datetime', '')
+                if dt:
+                    concert['date'] = dt[:10]
+                    break
+                text = d.get_text().strip()
+                date_match = re.search(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})', text)
+                if date_match:
+                    day, month, year = date_match.groups()
+                    if len(year) == 2:
+                        year = '20' + year
+                    concert['date'] = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+                    break
+    
+    # Try to parse details from title for LiveNation and similar sites
+    if concert['name'] and not concert['artist']:
+        title = concert['name']
+        
+        # LiveNation format: "Artist Name, City, Date, Venue - site"
+        # Example: "Lenny Kravitz Live 2026, Budapest, 2026. augusztus 2., , Tickets"
+        title_clean = re.sub(r'\s*[-–|]\s*(www\.|Tickets).*$', '', title, flags=re.I)
+        title_clean = re.sub(r',\s*Tickets.*$', '', title_clean, flags=re.I)
+        
+        # Hungarian month names
+        hu_months = {
+            'január': '01', 'február': '02', 'március': '03', 'április': '04',
+            'május': '05', 'június': '06', 'július': '07', 'augusztus': '08',
+            'szeptember': '09', 'október': '10', 'november': '11', 'december': '12'
+        }
+        
+        # Try to extract date from Hungarian format: "2026. augusztus 2."
+        hu_date_match = re.search(r'(\d{4})\.\s*([a-záéíóöőúüű]+)\s*(\d{1,2})\.?', title_clean, re.I)
+        if hu_date_match:
+            year, month_hu, day = hu_date_match.groups()
+            month_num = hu_months.get(month_hu.lower(), '')
+            if month_num:
+                concert['date'] = f"{year}-{month_num}-{day.zfill(2)}"
+        
+        # Split by comma and try to extract artist and city
+        parts = [p.strip() for p in title_clean.split(',') if p.strip()]
+        if parts:
+            # First part is usually artist/event name
+            artist_part = parts[0]
+            # Remove "Live 2026" or similar suffixes
+            artist_clean = re.sub(r'\s*(Live|Tour|Concert)\s*\d{4}.*$', '', artist_part, flags=re.I)
+            if artist_clean:
+                concert['artist'] = artist_clean.strip()
+            
+            # Look for city (usually after artist, before date)
+            for part in parts[1:]:
+                # Skip if it looks like a date
+                if re.search(r'\d{4}', part):
+                    continue
+                # Skip empty or very short
+                if len(part) < 3:
+                    continue
+                # This is likely the city
+                if not concert['city']:
+                    concert['city'] = part.strip()
+                    break
+        
+        # For LiveNation Hungary, set country
+        if 'livenation.hu' in url.lower() and not concert['country']:
+            concert['country'] = 'Hungary'
+    
+    if concert['name'] or concert['venue']:
+        return {'concert': concert, 'error': None}
+    else:
+        return {'error': 'Could not extract event details from page', 'concert': None}
+
+
+def _normalize_event_url(url: str) -> str:
+    """Normalize an event URL for caching: lowercase host, no fragment, tracking params or trailing slash, sorted query"""
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_') and k.lower() not in URL_TRACKING_PARAMS
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def _remember_url_entry(url_hash: str, entry: Dict):
+    """Put an entry in the in-process URL cache, evicting the least recently used beyond MAX_URL_CACHE_ENTRIES"""
+    with _url_cache_lock:
+        _url_cache[url_hash] = entry
+        _url_cache.move_to_end(url_hash)
+        while len(_url_cache) > MAX_URL_CACHE_ENTRIES:
+            _url_cache.popitem(last=False)
+
+
+def _get_url_cache(url_hash: str) -> Optional[Dict]:
+    """Get a URL extraction entry (fresh or expired) from memory, falling back to the database"""
+    with _url_cache_lock:
+        entry = _url_cache.get(url_hash)
+        if entry:
+            _url_cache.move_to_end(url_hash)
+            return entry
+    
+    try:
+        from models import get_db, ConcertUrlCache
+        db = get_db()
+        if not db:
+            return None
+        
+        try:
+            cached = db.query(ConcertUrlCache).filter(ConcertUrlCache.url_hash == url_hash).first()
+            if cached and cached.concert_json:
+                entry = {
+                    'concert': json.loads(cached.concert_json),
+                    'etag': cached.etag,
+                    'last_modified': cached.last_modified,
+                    'expires_at': cached.expires_at or datetime.utcnow()
+                }
+                _remember_url_entry(url_hash, entry)
+            return entry
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"URL cache read error: {e}")
+        return None
+
+
+def _set_url_cache(url_hash: str, url: str, concert: Dict, etag: Optional[str] = None, last_modified: Optional[str] = None):
+    """Save a URL extraction result to memory and the shared database cache"""
+    expires_at = datetime.utcnow() + timedelta(hours=URL_CACHE_HOURS)
+    _remember_url_entry(url_hash, {
+        'concert': concert,
+        'etag': etag,
+        'last_modified': last_modified,
+        'expires_at': expires_at
+    })
+    
+    db = None
+    try:
+        from models import get_db, ConcertUrlCache
+        db = get_db()
+        if not db:
+            return
+        
+        concert_json = json.dumps(concert, ensure_ascii=False)
+        existing = db.query(ConcertUrlCache).filter(ConcertUrlCache.url_hash == url_hash).first()
+        if existing:
+            existing.concert_json = concert_json
+            existing.etag = etag
+            existing.last_modified = last_modified
+            existing.created_at = datetime.utcnow()
+            existing.expires_at = expires_at
+        else:
+            db.add(ConcertUrlCache(
+                url_hash=url_hash,
+                url=url,
+                concert_json=concert_json,
+                etag=etag,
+                last_modified=last_modified,
+                expires_at=expires_at
+            ))
+        db.commit()
+        db.close()
+    except Exception as e:
+        print(f"URL cache write error: {e}")
+        try:
+            db.rollback()
+            db.close()
+        except:
+            pass
+
+
+def _url_cache_result(entry: Dict, url: str) -> Dict:
+    """Build an extract_concert_from_url result from a cache entry"""
+    concert = copy.deepcopy(entry['concert'])
+    concert['url'] = url
+    return {'concert': concert, 'error': None, 'from_cache': True}
+
+
 def extract_concert_from_url(url: str) -> Dict:
     """
     Extract concert details from any event URL.
     Supports multiple ticket platforms: Ticketmaster, Eventim, See Tickets, Viagogo, StubHub, etc.
     
+    Results are cached by normalized URL for URL_CACHE_HOURS, in memory and in the
+    database (shared across sessions). Expired entries are revalidated with
+    ETag/Last-Modified, and served as-is if the page can't be fetched.
+    
     Args:
         url: Event page URL
     
@@ -915,177 +1474,44 @@ def extract_concert_from_url(url: str) -> Dict:
     if not url or not url.startswith('http'):
         return {'error': 'Invalid URL', 'concert': None}
     
+    cache_url = _normalize_event_url(url)
+    url_hash = hashlib.sha256(cache_url.encode('utf-8')).hexdigest()
+    cached = _get_url_cache(url_hash)
+    if cached and cached['expires_at'] > datetime.utcnow():
+        return _url_cache_result(cached, url)
+    
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
         }
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
         
         response = requests.get(url, headers=headers, timeout=20)
+        if response.status_code == 304 and cached:
+            _set_url_cache(url_hash, cache_url, cached['concert'], cached.get('etag'), cached.get('last_modified'))
+            return _url_cache_result(cached, url)
         if response.status_code != 200:
             return {'error': f'Could not fetch page (status {response.status_code})', 'concert': None}
         
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        concert = {
-            'name': '',
-            'artist': '',
-            'date': '',
-            'time': '',
-            'venue': '',
-            'city': '',
-            'country': '',
-            'address': '',
-            'url': url,
-            'source': _get_url_source(url)
-        }
-        
-        og_title = soup.find('meta', property='og:title')
-        if og_title:
-            concert['name'] = og_title.get('content', '')
-        
-        if not concert['name']:
-            title_tag = soup.find('title')
-            if title_tag:
-                concert['name'] = title_tag.get_text().strip()
-        
-        for tag in soup.find_all(['script']):
-            if tag.get('type') == 'application/ld+json':
-                try:
-                    ld_data = json.loads(tag.string)
-                    if isinstance(ld_data, list):
-                        ld_data = ld_data[0]
-                    
-                    if ld_data.get('@type') in ['Event', 'MusicEvent', 'Festival']:
-                        concert['name'] = ld_data.get('name', concert['name'])
-                        
-                        start_date = ld_data.get('startDate', '')
-                        if start_date:
-                            if 'T' in start_date:
-                                parts = start_date.split('T')
-                                concert['date'] = parts[0]
-                                if len(parts) > 1:
-                                    time_part = parts[1].split('+')[0].split('-')[0][:5]
-                                    concert['time'] = time_part
-                            else:
-                                concert['date'] = start_date[:10]
-                        
-                        location = ld_data.get('location', {})
-                        if isinstance(location, dict):
-                            concert['venue'] = location.get('name', '')
-                            address = location.get('address', {})
-                            if isinstance(address, dict):
-                                concert['city'] = address.get('addressLocality', '')
-                                concert['country'] = address.get('addressCountry', '')
-                                concert['address'] = address.get('streetAddress', '')
-                            elif isinstance(address, str):
-                                concert['address'] = address
-                        
-                        performers = ld_data.get('performer', [])
-                        if performers:
-                            if isinstance(performers, list) and len(performers) > 0:
-                                concert['artist'] = performers[0].get('name', '')
-                            elif isinstance(performers, dict):
-                                concert['artist'] = performers.get('name', '')
-                        
-                        break
-                except:
-                    continue
-        
-        if not concert['venue']:
-            venue_patterns = [
-                soup.find(class_=re.compile(r'venue', re.I)),
-                soup.find(attrs={'data-venue': True}),
-                soup.find('span', class_=re.compile(r'location', re.I)),
-            ]
-            for v in venue_patterns:
-                if v:
-                    text = v.get_text().strip()
-                    if text and len(text) < 200:
-                        concert['venue'] = text
-                        break
-        
-        if not concert['date']:
-            date_patterns = [
-                soup.find(class_=re.compile(r'date', re.I)),
-                soup.find('time'),
-                soup.find(attrs={'datetime': True}),
-            ]
-            for d in date_patterns:
-                if d:
-                    dt = d.get('datetime', '')
-                    if dt:
-                        concert['date'] = dt[:10]
-                        break
-                    text = d.get_text().strip()
-                    date_match = re.search(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{2,4})', text)
-                    if date_match:
-                        day, month, year = date_match.groups()
-                        if len(year) == 2:
-                            year = '20' + year
-                        concert['date'] = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                        break
-        
-        # Try to parse details from title for LiveNation and similar sites
-        if concert['name'] and not concert['artist']:
-            title = concert['name']
-            
-            # LiveNation format: "Artist Name, City, Date, Venue - site"
-            # Example: "Lenny Kravitz Live 2026, Budapest, 2026. augusztus 2., , Tickets"
-            title_clean = re.sub(r'\s*[-–|]\s*(www\.|Tickets).*$', '', title, flags=re.I)
-            title_clean = re.sub(r',\s*Tickets.*$', '', title_clean, flags=re.I)
-            
-            # Hungarian month names
-            hu_months = {
-                'január': '01', 'február': '02', 'március': '03', 'április': '04',
-                'május': '05', 'június': '06', 'július': '07', 'augusztus': '08',
-                'szeptember': '09', 'október': '10', 'november': '11', 'december': '12'
-            }
-            
-            # Try to extract date from Hungarian format: "2026. augusztus 2."
-            hu_date_match = re.search(r'(\d{4})\.\s*([a-záéíóöőúüű]+)\s*(\d{1,2})\.?', title_clean, re.I)
-            if hu_date_match:
-                year, month_hu, day = hu_date_match.groups()
-                month_num = hu_months.get(month_hu.lower(), '')
-                if month_num:
-                    concert['date'] = f"{year}-{month_num}-{day.zfill(2)}"
-            
-            # Split by comma and try to extract artist and city
-            parts = [p.strip() for p in title_clean.split(',') if p.strip()]
-            if parts:
-                # First part is usually artist/event name
-                artist_part = parts[0]
-                # Remove "Live 2026" or similar suffixes
-                artist_clean = re.sub(r'\s*(Live|Tour|Concert)\s*\d{4}.*$', '', artist_part, flags=re.I)
-                if artist_clean:
-                    concert['artist'] = artist_clean.strip()
-                
-                # Look for city (usually after artist, before date)
-                for part in parts[1:]:
-                    # Skip if it looks like a date
-                    if re.search(r'\d{4}', part):
-                        continue
-                    # Skip empty or very short
-                    if len(part) < 3:
-                        continue
-                    # This is likely the city
-                    if not concert['city']:
-                        concert['city'] = part.strip()
-                        break
-            
-            # For LiveNation Hungary, set country
-            if 'livenation.hu' in url.lower() and not concert['country']:
-                concert['country'] = 'Hungary'
-        
-        if concert['name'] or concert['venue']:
-            return {'concert': concert, 'error': None}
-        else:
-            return {'error': 'Could not extract event details from page', 'concert': None}
+        result = _parse_concert_page(response.text, url)
+        if result.get('concert'):
+            _set_url_cache(url_hash, cache_url, result['concert'],
+                           response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return result
         
     except requests.exceptions.Timeout:
+        if cached:
+            return _url_cache_result(cached, url)
         return {'error': 'Request timeout', 'concert': None}
     except requests.exceptions.RequestException as e:
+        if cached:
+            return _url_cache_result(cached, url)
         return {'error': f'Network error: {str(e)}', 'concert': None}
     except Exception as e:
         return {'error': f'Extraction error: {str(e)}', 'concert': None}
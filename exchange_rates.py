@@ -2,18 +2,35 @@
 Exchange Rate Module
 Fetches current exchange rates from Bank of Israel official API
 EUR, USD, GBP to ILS with 0.05 NIS margin
+
+Rates are shared by all app processes through the `exchange_rates` table.
+Readers always get the last good rates immediately; once they are older than
+CACHE_DURATION_HOURS minus REFRESH_AHEAD_MINUTES a background thread refreshes them.
+
+A circuit breaker guards the Bank of Israel endpoint: after BREAKER_FAILURE_THRESHOLD
+failed refreshes in a row no request is made for BREAKER_OPEN_SECONDS (the last good
+rates keep being served), then a single background probe checks whether it recovered.
 """
 
+import csv
+import io
+import re
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 RATE_MARGIN = 0.05
 CACHE_DURATION_HOURS = 1
+REFRESH_AHEAD_MINUTES = 10
 
+# In-process copy of the shared rates (with margin); last_updated is when they were fetched (UTC)
 _rates_cache = {
     'rates': None,
     'last_updated': None
 }
+_refresh_lock = threading.Lock()
+_refresh_running = False
 
 DEFAULT_RATES = {
     'EUR': 3.76,
@@ -21,55 +38,349 @@ DEFAULT_RATES = {
     'GBP': 4.28
 }
 
+CURRENCIES = ['EUR', 'USD', 'GBP']
+BOI_EXR_URL = "https://edge.boi.gov.il/FusionEdgeServer/sdmx/v2/data/dataflow/BOI.STATISTICS/EXR/1.0/{series}"
+REQUEST_TIMEOUT = 10
+CONNECT_TIMEOUT = 3
+
+# Circuit breaker for edge.boi.gov.il
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_OPEN_SECONDS = 5 * 60
+
+_breaker = {'failures': 0, 'opened_at': None, 'probing': False, 'last_error': None, 'last_success_at': None}
+_breaker_lock = threading.Lock()
+
+_SERIES_RE = re.compile(r'RER_([A-Z]{3})_ILS')
+
+def _series_code(currency: str) -> str:
+    return f"RER_{currency}_ILS"
+
+
+def iter_observations(text: str):
+    """Parse a Bank of Israel SDMX CSV response by column name, yielding (currency, rate, observation date string)"""
+    reader = csv.DictReader(io.StringIO(text.strip()))
+    for row in reader:
+        row = {(k or '').strip().upper(): (v or '').strip() for k, v in row.items()}
+        value = row.get('OBS_VALUE')
+        if not value:
+            continue
+        # The series code (RER_EUR_ILS) is in SERIES_CODE, or in the key column on other layouts
+        currency = None
+        for column in ['SERIES_CODE', 'KEY', 'SERIES'] + list(row):
+            match = _SERIES_RE.search(row.get(column, ''))
+            if match:
+                currency = match.group(1)
+                break
+        if not currency:
+            currency = row.get('BASE_CURRENCY') or None
+        if not currency:
+            continue
+        try:
+            rate = float(value)
+        except ValueError:
+            continue
+        yield currency, rate, row.get('TIME_PERIOD', '')
+
+
+def parse_rates_csv(text: str) -> dict:
+    """
+    Parse a Bank of Israel SDMX CSV response.
+    
+    Returns:
+        dict of currency -> (rate, observation date string), latest observation per series
+    """
+    rates = {}
+    for currency, rate, period in iter_observations(text):
+        if currency not in rates or period >= rates[currency][1]:
+            rates[currency] = (rate, period)
+    return rates
+
+
+def _fetch_series(currencies: list) -> dict:
+    """One SDMX request for the latest observation of every requested series"""
+    series = ','.join(_series_code(c) for c in currencies)
+    response = requests.get(
+        BOI_EXR_URL.format(series=series),
+        params={"format": "csv", "lastNObservations": "1"},
+        timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT)
+    )
+    response.raise_for_status()
+    return {c: r for c, r in parse_rates_csv(response.text).items() if c in currencies}
+
+
+def _breaker_allows() -> bool:
+    """Closed: allow. Open: refuse until BREAKER_OPEN_SECONDS passed, then allow one probe"""
+    with _breaker_lock:
+        if _breaker['opened_at'] is None:
+            return True
+        if (datetime.utcnow() - _breaker['opened_at']).total_seconds() < BREAKER_OPEN_SECONDS or _breaker['probing']:
+            return False
+        _breaker['probing'] = True
+        return True
+
+
+def _record_result(success: bool, error: str = None):
+    with _breaker_lock:
+        _breaker['probing'] = False
+        if success:
+            _breaker['failures'] = 0
+            _breaker['opened_at'] = None
+            _breaker['last_error'] = None
+            _breaker['last_success_at'] = datetime.utcnow()
+            return
+        _breaker['failures'] += 1
+        _breaker['last_error'] = error or "no rates in response"
+        if _breaker['failures'] < BREAKER_FAILURE_THRESHOLD and _breaker['opened_at'] is None:
+            return
+        _breaker['opened_at'] = datetime.utcnow()
+    # Probe again once the breaker half-opens, even if nobody asks for rates meanwhile
+    probe = threading.Timer(BREAKER_OPEN_SECONDS + 1, schedule_rates_refresh)
+    probe.daemon = True
+    probe.start()
+
+
+def get_breaker_status() -> dict:
+    """Bank of Israel circuit breaker state: 'closed', 'open' or 'half_open', failures and last error"""
+    with _breaker_lock:
+        if _breaker['opened_at'] is None:
+            state = 'closed'
+        elif (datetime.utcnow() - _breaker['opened_at']).total_seconds() < BREAKER_OPEN_SECONDS:
+            state = 'open'
+        else:
+            state = 'half_open'
+        return {
+            'state': state,
+            'failures': _breaker['failures'],
+            'last_error': _breaker['last_error'],
+            'last_success_at': _breaker['last_success_at']
+        }
+
+
+def fetch_rate_history(currencies: list, start_date, end_date) -> list:
+    """
+    Fetch daily Bank of Israel rates (without margin) between two dates, all series in one request.
+    
+    Returns:
+        list of (currency, observation date string, rate)
+    """
+    series = ','.join(_series_code(c) for c in currencies)
+    response = requests.get(
+        BOI_EXR_URL.format(series=series),
+        params={"format": "csv", "startperiod": start_date.isoformat(), "endperiod": end_date.isoformat()},
+        timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT * 3)
+    )
+    response.raise_for_status()
+    return [(c, period, rate) for c, rate, period in iter_observations(response.text) if c in currencies and period]
+
+
+def fetch_base_observations(currencies: list = None) -> dict:
+    """
+    Fetch the latest Bank of Israel representative rates (without margin).
+    All series are requested in one call; any series missing from that response
+    is fetched on its own, concurrently.
+    
+    Returns:
+        dict of currency -> (rate, observation date) for the currencies that could be fetched
+    """
+    currencies = currencies or CURRENCIES
+    if not _breaker_allows():
+        return {}
+    
+    rates = {}
+    unreachable = False
+    error = None
+    try:
+        rates = _fetch_series(currencies)
+    except Exception as e:
+        print(f"Error fetching exchange rates: {e}")
+        # Per-series retries would only wait out the same timeout again
+        unreachable = isinstance(e, (requests.ConnectionError, requests.Timeout))
+        error = str(e)
+    
+    missing = [c for c in currencies if c not in rates]
+    if missing and len(currencies) > 1 and not unreachable:
+        def fetch_one(currency):
+            try:
+                return _fetch_series([currency]).get(currency)
+            except Exception as e:
+                print(f"Error fetching {currency} rate: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            for currency, result in zip(missing, pool.map(fetch_one, missing)):
+                if result:
+                    rates[currency] = result
+    _record_result(bool(rates), error)
+    return rates
+
+
+def fetch_base_rates(currencies: list = None) -> dict:
+    """Latest Bank of Israel rates (without margin) as currency -> rate"""
+    return {c: rate for c, (rate, _) in fetch_base_observations(currencies).items()}
+
+
 def fetch_single_rate(currency: str) -> float:
     """Fetch single currency rate from Bank of Israel CSV endpoint"""
+    return fetch_base_rates([currency]).get(currency, DEFAULT_RATES.get(currency, 3.50))
+
+
+def _with_margin(base_rates: dict) -> dict:
+    return {
+        currency: round(base_rates.get(currency, DEFAULT_RATES.get(currency, 3.50)) + RATE_MARGIN, 2)
+        for currency in CURRENCIES
+    }
+
+
+def _load_shared_rates():
+    """Read the shared rates; returns (base rates, oldest updated_at) or (None, None)"""
     try:
-        series_code = f"RER_{currency}_ILS"
-        url = f"https://edge.boi.gov.il/FusionEdgeServer/sdmx/v2/data/dataflow/BOI.STATISTICS/EXR/1.0/{series_code}"
-        params = {
-            "format": "csv",
-            "lastNObservations": "1"
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        lines = response.text.strip().split('\n')
-        if len(lines) >= 2:
-            data_line = lines[1]
-            fields = data_line.split(',')
-            obs_value_index = 13
-            if len(fields) > obs_value_index:
-                return float(fields[obs_value_index])
-        
-        return DEFAULT_RATES.get(currency, 3.50)
-        
+        from models import get_db, ExchangeRate
+        db = get_db()
+        if not db:
+            return None, None
+        rows = db.query(ExchangeRate).filter(ExchangeRate.currency.in_(CURRENCIES)).all()
+        db.close()
+        if not rows:
+            return None, None
+        return {row.currency: row.rate for row in rows}, min(row.updated_at for row in rows)
     except Exception as e:
-        print(f"Error fetching {currency} rate: {e}")
-        return DEFAULT_RATES.get(currency, 3.50)
+        print(f"Exchange rate cache read error: {e}")
+        return None, None
+
+
+def _save_shared_rates(observations: dict, updated_at: datetime):
+    """Upsert fetched rates into the shared table"""
+    db = None
+    try:
+        from models import get_db, ExchangeRate
+        db = get_db()
+        if not db:
+            return
+        existing = {row.currency: row for row in db.query(ExchangeRate).filter(ExchangeRate.currency.in_(list(observations))).all()}
+        for currency, (rate, rate_date) in observations.items():
+            row = existing.get(currency)
+            if not row:
+                row = ExchangeRate(currency=currency)
+                db.add(row)
+            row.rate = rate
+            row.rate_date = rate_date
+            row.updated_at = updated_at
+        db.commit()
+        db.close()
+    except Exception as e:
+        print(f"Exchange rate cache write error: {e}")
+        try:
+            db.rollback()
+            db.close()
+        except:
+            pass
+
+
+def _needs_refresh(last_updated: datetime, now: datetime) -> bool:
+    return now - last_updated >= timedelta(hours=CACHE_DURATION_HOURS) - timedelta(minutes=REFRESH_AHEAD_MINUTES)
+
+
+def refresh_exchange_rates() -> bool:
+    """
+    Fetch rates from the Bank of Israel and store them for every process.
+    Currencies that fail keep their last good rate.
+    
+    Returns:
+        True if at least one rate was fetched
+    """
+    now = datetime.utcnow()
+    # Another process may have refreshed while this one was waiting
+    shared, updated_at = _load_shared_rates()
+    if shared and len(shared) == len(CURRENCIES) and not _needs_refresh(updated_at, now):
+        _rates_cache['rates'] = _with_margin(shared)
+        _rates_cache['last_updated'] = updated_at
+        return True
+    
+    observations = fetch_base_observations(CURRENCIES)
+    if not observations:
+        return False
+    
+    _save_shared_rates(observations, now)
+    base_rates = dict(shared or {})
+    base_rates.update({c: rate for c, (rate, _) in observations.items()})
+    _rates_cache['rates'] = _with_margin(base_rates)
+    _rates_cache['last_updated'] = now
+    return True
+
+
+def _refresh_in_background():
+    global _refresh_running
+    try:
+        refresh_exchange_rates()
+    except Exception as e:
+        print(f"Exchange rate refresh error: {e}")
+    finally:
+        with _refresh_lock:
+            _refresh_running = False
+
+
+def schedule_rates_refresh():
+    """Start a background refresh unless one is already running in this process"""
+    global _refresh_running
+    with _refresh_lock:
+        if _refresh_running:
+            return
+        _refresh_running = True
+    threading.Thread(target=_refresh_in_background, daemon=True, name='exchange-rate-refresh').start()
 
 
 def fetch_exchange_rates():
     """
-    Fetch current exchange rates from Bank of Israel API
+    Get current exchange rates (Bank of Israel + margin) without waiting on the network
+    when any earlier rates exist; expiring rates are refreshed in the background.
     Returns dict with EUR, USD, GBP rates to ILS (with margin added)
     """
-    global _rates_cache
-    
-    now = datetime.now()
+    now = datetime.utcnow()
     if _rates_cache['rates'] and _rates_cache['last_updated']:
-        if now - _rates_cache['last_updated'] < timedelta(hours=CACHE_DURATION_HOURS):
+        if not _needs_refresh(_rates_cache['last_updated'], now):
             return _rates_cache['rates']
     
-    rates = {}
-    for currency in ['EUR', 'USD', 'GBP']:
-        base_rate = fetch_single_rate(currency)
-        rates[currency] = round(base_rate + RATE_MARGIN, 2)
+    shared, updated_at = _load_shared_rates()
+    if shared:
+        _rates_cache['rates'] = _with_margin(shared)
+        _rates_cache['last_updated'] = updated_at
     
-    _rates_cache['rates'] = rates
-    _rates_cache['last_updated'] = now
+    if _rates_cache['rates']:
+        if _needs_refresh(_rates_cache['last_updated'], now):
+            schedule_rates_refresh()
+        return _rates_cache['rates']
     
-    return rates
+    # Nothing cached anywhere yet - this first fetch has to wait
+    if not refresh_exchange_rates():
+        return _with_margin({})
+    return _rates_cache['rates']
+
+
+def get_rates_last_updated():
+    """When the rates in use were fetched (UTC), or None if only defaults are available"""
+    return _rates_cache['last_updated']
+
+
+def get_rates_status() -> dict:
+    """
+    Freshness of the rates in use, for the UI.
+    
+    Returns:
+        dict with freshness ('fresh', 'stale' - older than CACHE_DURATION_HOURS, or 'default' -
+        no rate was ever fetched), updated_at (UTC), age_minutes and the breaker status
+    """
+    updated_at = _rates_cache['last_updated']
+    if updated_at is None:
+        freshness, age_minutes = 'default', None
+    else:
+        age_minutes = int((datetime.utcnow() - updated_at).total_seconds() // 60)
+        freshness = 'fresh' if age_minutes < CACHE_DURATION_HOURS * 60 else 'stale'
+    return {
+        'freshness': freshness,
+        'updated_at': updated_at,
+        'age_minutes': age_minutes,
+        'breaker': get_breaker_status()
+    }
 
 
 def get_rate_for_currency(currency: str) -> float:
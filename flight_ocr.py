@@ -3,24 +3,82 @@ Flight OCR using Gemini AI
 Extracts flight details from screenshots/images
 """
 
-import os
 import json
-import time
-from google import genai
+import hashlib
 from google.genai import types
+from gemini_client import generate_content
+from ocr_image import prepare_ocr_image
+from ocr_cache import image_cache_key, get_cached_result, save_result
+from ocr_output import json_config, parse_json_response, coerce_to_schema
 
-AI_INTEGRATIONS_GEMINI_API_KEY = os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY")
-AI_INTEGRATIONS_GEMINI_BASE_URL = os.environ.get("AI_INTEGRATIONS_GEMINI_BASE_URL")
+# Bump when the prompt or result fields change, so cached results are not reused
+PROMPT_VERSION = 3
 
-def get_client():
-    """Create a new client instance to avoid stale connections"""
-    return genai.Client(
-        api_key=AI_INTEGRATIONS_GEMINI_API_KEY,
-        http_options={
-            'api_version': '',
-            'base_url': AI_INTEGRATIONS_GEMINI_BASE_URL   
-        }
-    )
+# Declared to Gemini as the response schema; parsed output is coerced to it
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'flights': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'direction': {'type': 'STRING', 'enum': ['outbound', 'return']},
+                    'from': {'type': 'STRING', 'description': '3-letter IATA code'},
+                    'to': {'type': 'STRING', 'description': '3-letter IATA code'},
+                    'date': {'type': 'STRING', 'description': 'DD/MM or DD/MM/YY'},
+                    'time': {'type': 'STRING', 'description': 'HH:MM'},
+                    'arrival_time': {'type': 'STRING'},
+                    'flight_no': {'type': 'STRING'},
+                    'duration': {'type': 'STRING'},
+                },
+                'required': ['direction', 'from', 'to', 'date', 'time'],
+            },
+        },
+    },
+    'required': ['flights'],
+}
+
+MULTI_IMAGE_PROMPT = """These {count} screenshots belong to the same booking - for example the outbound
+and the return flight shown on separate screens. Read them together as one itinerary
+and list every flight once, even if it appears on more than one screenshot.
+
+"""
+
+def _same_flight(a: dict, b: dict) -> bool:
+    """Whether two extracted legs describe the same flight (missing fields match anything)"""
+    if a["from"] != b["from"] or a["to"] != b["to"]:
+        return False
+    if a["flight_no"] and b["flight_no"]:
+        return a["flight_no"] == b["flight_no"] and (not a["date"] or not b["date"] or a["date"] == b["date"])
+    return a["date"] == b["date"] and (not a["time"] or not b["time"] or a["time"] == b["time"])
+
+def merge_flights(flights: list) -> list:
+    """
+    Merge legs extracted from several screenshots into one itinerary:
+    duplicates are combined (filling empty fields), a missing direction is taken
+    from the leg's position, and outbound legs come before return legs.
+    """
+    merged = []
+    for flight in flights:
+        flight = dict(flight)
+        flight["from"] = flight.get("from", "").upper().strip()
+        flight["to"] = flight.get("to", "").upper().strip()
+        flight["flight_no"] = flight.get("flight_no", "").upper().replace(" ", "")
+        existing = next((m for m in merged if _same_flight(m, flight)), None)
+        if existing:
+            for key, value in flight.items():
+                if value and not existing.get(key):
+                    existing[key] = value
+        else:
+            merged.append(flight)
+    
+    # Missing direction: the first flight is outbound, a later last one is the return
+    for i, flight in enumerate(merged):
+        if not flight.get("direction"):
+            flight["direction"] = "return" if i > 0 and i == len(merged) - 1 else "outbound"
+    
+    return sorted(merged, key=lambda f: 0 if f["direction"] == "outbound" else 1)
 
 def extract_flight_data(image_bytes: bytes, max_retries: int = 3) -> dict:
     """
@@ -28,12 +86,25 @@ def extract_flight_data(image_bytes: bytes, max_retries: int = 3) -> dict:
     
     Args:
         image_bytes: The flight screenshot as bytes
-        max_retries: Number of retry attempts for network errors
+        max_retries: Total Gemini attempts for transient errors (timeouts, 429, 5xx, connection drops)
         
     Returns:
         Dictionary with extracted flights array:
         - flights: array of flight objects with from, to, date, time, flight_no
     """
+    return extract_flights_data([image_bytes], max_retries)
+
+def extract_flights_data(images: list, max_retries: int = 3) -> dict:
+    """
+    Extract one merged itinerary from several flight screenshots in a single Gemini request.
+    
+    Args:
+        images: Flight screenshots as bytes (e.g. outbound and return on separate screens)
+        max_retries: Total Gemini attempts for transient errors (timeouts, 429, 5xx, connection drops)
+        
+    Returns:
+        Same structure as extract_flight_data, with legs de-duplicated across the images
+    """
     prompt = """Analyze this flight booking/search screenshot and extract ALL flight information.
 Return ONLY a valid JSON object with this structure (no markdown, no explanation):
 {
@@ -60,57 +131,58 @@ Rules:
 - Leave fields empty string "" if not visible
 - Return ONLY the JSON object, nothing else."""
 
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            client = get_client()
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    prompt,
-                    types.Part(
-                        inline_data=types.Blob(
-                            mime_type="image/jpeg",
-                            data=image_bytes
-                        )
-                    )
-                ]
-            )
-            
-            result_text = response.text.strip()
-            
-            if result_text.startswith("```"):
-                lines = result_text.split('\n')
-                result_text = '\n'.join(lines[1:-1])
-            
-            data = json.loads(result_text)
-            
-            return {
-                "flights": data.get("flights", []),
-                "success": True,
-                "error": None
-            }
-            
-        except json.JSONDecodeError as e:
-            return {
-                "flights": [],
-                "success": False,
-                "error": f"Could not parse response: {str(e)}"
-            }
-        except Exception as e:
-            last_error = str(e)
-            if "Connection refused" in last_error or "111" in last_error:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-            return {
-                "flights": [],
-                "success": False,
-                "error": last_error
-            }
+    prepared = [prepare_ocr_image(image_bytes) for image_bytes in images if image_bytes]
+    if not prepared:
+        return {
+            "flights": [],
+            "success": False,
+            "error": "No image to scan"
+        }
+    if len(prepared) > 1:
+        prompt = MULTI_IMAGE_PROMPT.format(count=len(prepared)) + prompt
+        cache_bytes = b''.join(hashlib.sha256(image_bytes).digest() for image_bytes, _ in prepared)
+    else:
+        cache_bytes = prepared[0][0]
+    
+    cache_key = image_cache_key('flight', PROMPT_VERSION, cache_bytes)
+    cached = get_cached_result('flight', cache_key)
+    if cached:
+        return cached
     
-    return {
-        "flights": [],
-        "success": False,
-        "error": f"Failed after {max_retries} attempts: {last_error}"
-    }
+    try:
+        response = generate_content(
+            contents=[prompt] + [
+                types.Part(
+                    inline_data=types.Blob(
+                        mime_type=mime_type,
+                        data=image_bytes
+                    )
+                )
+                for image_bytes, mime_type in prepared
+            ],
+            config=json_config(RESPONSE_SCHEMA),
+            max_attempts=max_retries
+        )
+        
+        data = coerce_to_schema(parse_json_response(response.text), RESPONSE_SCHEMA)
+        
+        result = {
+            "flights": merge_flights(data["flights"]),
+            "success": True,
+            "error": None
+        }
+        save_result('flight', cache_key, result)
+        return result
+        
+    except json.JSONDecodeError as e:
+        return {
+            "flights": [],
+            "success": False,
+            "error": f"Could not parse response: {str(e)}"
+        }
+    except Exception as e:
+        return {
+            "flights": [],
+            "success": False,
+            "error": str(e)
+        }
@@ -0,0 +1,307 @@
+"""
+Shared Gemini Client
+One thread-safe genai.Client for the OCR modules and the AI chatbot, so the HTTP
+connection pool (keep-alive, TLS sessions) is reused instead of rebuilt per call.
+The client is replaced after a connection error or once it reaches CLIENT_MAX_AGE_SECONDS.
+
+generate_content() wraps every Gemini call with one resilience policy: transient errors
+(connection failures, timeouts, 429, 5xx) are retried with exponential backoff and jitter,
+honouring Retry-After, within an overall deadline, behind a shared circuit breaker.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from google import genai
+from google.genai import errors, types
+
+AI_INTEGRATIONS_GEMINI_API_KEY = os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY")
+AI_INTEGRATIONS_GEMINI_BASE_URL = os.environ.get("AI_INTEGRATIONS_GEMINI_BASE_URL")
+
+# Rebuild the client periodically so a silently dropped pool doesn't linger
+CLIENT_MAX_AGE_SECONDS = 30 * 60
+
+# Error text that means the connection (not the request) failed
+CONNECTION_ERROR_MARKERS = (
+    "Connection refused",
+    "[Errno 111]",
+    "Connection reset",
+    "Server disconnected",
+    "RemoteProtocolError",
+    "ConnectError",
+)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Retry policy
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_DEADLINE_SECONDS = 60
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 10.0
+# Attempts get at least this much time, otherwise the deadline is treated as reached
+MIN_ATTEMPT_SECONDS = 3.0
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Circuit breaker: after this many failed calls in a row, fail fast for BREAKER_OPEN_SECONDS
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_OPEN_SECONDS = 30
+
+_client = None
+_created_at = 0.0
+_reconnects = 0
+_lock = threading.Lock()
+
+_breaker = {'failures': 0, 'opened_at': None, 'probing': False}
+_breaker_lock = threading.Lock()
+
+
+class GeminiUnavailable(Exception):
+    """Gemini call given up: circuit breaker open, deadline reached or retries exhausted"""
+
+
+def _build_client():
+    return genai.Client(
+        api_key=AI_INTEGRATIONS_GEMINI_API_KEY,
+        http_options={
+            'api_version': '',
+            'base_url': AI_INTEGRATIONS_GEMINI_BASE_URL
+        }
+    )
+
+
+def get_client():
+    """Get the shared client, creating it on first use, after a connection error or when too old"""
+    global _client, _created_at
+    with _lock:
+        if _client is None or time.monotonic() - _created_at > CLIENT_MAX_AGE_SECONDS:
+            # A replaced client is not closed - other threads may still be using it
+            _client = _build_client()
+            _created_at = time.monotonic()
+        return _client
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Check whether an exception from a Gemini call is a connection failure worth retrying"""
+    message = f"{type(error).__name__}: {error}"
+    return any(marker in message for marker in CONNECTION_ERROR_MARKERS)
+
+
+def report_connection_error(client=None):
+    """
+    Drop the shared client after a connection error so the next get_client() reconnects.
+    Pass the client that failed, so a client already replaced by another thread is kept.
+    """
+    global _client, _reconnects
+    with _lock:
+        if _client is not None and (client is None or client is _client):
+            _client = None
+            _reconnects += 1
+
+
+def get_client_status() -> dict:
+    """Age of the shared client and how many times it was dropped after connection errors"""
+    with _lock:
+        return {
+            'connected': _client is not None,
+            'age_seconds': time.monotonic() - _created_at if _client is not None else None,
+            'reconnects': _reconnects
+        }
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify a Gemini call failure.
+
+    Returns:
+        'connection' (drop the client and retry), 'retryable' (timeout, 429, 5xx)
+        or 'fatal' (bad request, auth - retrying will not help)
+    """
+    # An HTTP status means the connection worked, whatever the message says
+    if isinstance(error, errors.APIError):
+        return 'retryable' if error.code in RETRYABLE_STATUS_CODES else 'fatal'
+    if is_connection_error(error):
+        return 'connection'
+    message = f"{type(error).__name__}: {error}".lower()
+    if 'timeout' in message or 'timed out' in message:
+        return 'retryable'
+    return 'fatal'
+
+
+def _retry_after_seconds(error: Exception):
+    """Server-requested delay from a Retry-After header or a RetryInfo detail, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(getattr(error, 'details', '') or error))
+    return float(match.group(1)) if match else None
+
+
+def _backoff_seconds(attempt: int, error: Exception) -> float:
+    """Exponential backoff with full jitter, or the server's Retry-After if longer"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    retry_after = _retry_after_seconds(error)
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+def _breaker_allows() -> bool:
+    """Closed: allow. Open: refuse until BREAKER_OPEN_SECONDS passed, then allow one probe call"""
+    with _breaker_lock:
+        if _breaker['opened_at'] is None:
+            return True
+        if time.monotonic() - _breaker['opened_at'] < BREAKER_OPEN_SECONDS or _breaker['probing']:
+            return False
+        _breaker['probing'] = True
+        return True
+
+
+def _record_result(success: bool):
+    with _breaker_lock:
+        _breaker['probing'] = False
+        if success:
+            _breaker['failures'] = 0
+            _breaker['opened_at'] = None
+            return
+        _breaker['failures'] += 1
+        if _breaker['failures'] >= BREAKER_FAILURE_THRESHOLD or _breaker['opened_at'] is not None:
+            _breaker['opened_at'] = time.monotonic()
+
+
+def get_breaker_status() -> dict:
+    """Circuit breaker state: 'closed', 'open' or 'half_open', plus consecutive failures"""
+    with _breaker_lock:
+        if _breaker['opened_at'] is None:
+            state = 'closed'
+        elif time.monotonic() - _breaker['opened_at'] < BREAKER_OPEN_SECONDS:
+            state = 'open'
+        else:
+            state = 'half_open'
+        return {'state': state, 'failures': _breaker['failures']}
+
+
+def generate_content(contents, config=None, model: str = DEFAULT_MODEL,
+                     max_attempts: int = DEFAULT_MAX_ATTEMPTS, deadline_seconds: float = DEFAULT_DEADLINE_SECONDS):
+    """
+    Call models.generate_content under the shared retry/deadline/circuit breaker policy.
+
+    Args:
+        contents: Prompt and parts, as for client.models.generate_content
+        config: Optional GenerateContentConfig (its HTTP timeout is set from the remaining deadline)
+        model: Model name
+        max_attempts: Total attempts including the first call
+        deadline_seconds: Time budget for all attempts and backoff sleeps together
+
+    Returns:
+        The GenerateContentResponse
+
+    Raises:
+        GeminiUnavailable if the breaker is open, the deadline is reached or retries run out;
+        fatal API errors (e.g. 400/403) are re-raised as-is
+    """
+    if not _breaker_allows():
+        raise GeminiUnavailable("Gemini temporarily unavailable (circuit breaker open)")
+
+    deadline = time.monotonic() + deadline_seconds
+    last_error = None
+    for attempt in range(max(1, max_attempts)):
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_ATTEMPT_SECONDS:
+            break
+
+        timeout_options = types.HttpOptions(timeout=int(remaining * 1000))
+        call_config = (config.model_copy(update={'http_options': timeout_options}) if config
+                       else types.GenerateContentConfig(http_options=timeout_options))
+        client = None
+        try:
+            client = get_client()
+            response = client.models.generate_content(model=model, contents=contents, config=call_config)
+            _record_result(True)
+            return response
+        except Exception as e:
+            last_error = e
+            kind = classify_error(e)
+            if kind == 'fatal':
+                # The service answered - only transient failures count against the breaker
+                _record_result(True)
+                raise
+            if kind == 'connection':
+                report_connection_error(client)
+            if attempt < max_attempts - 1:
+                delay = _backoff_seconds(attempt, e)
+                if time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline:
+                    break
+                time.sleep(delay)
+
+    _record_result(False)
+    if last_error is None:
+        raise GeminiUnavailable(f"Gemini deadline of {deadline_seconds:.0f}s reached")
+    raise GeminiUnavailable(f"Gemini call failed after {attempt + 1} attempt(s): {last_error}") from last_error
+
+
+def generate_content_stream(contents, config=None, model: str = DEFAULT_MODEL,
+                            max_attempts: int = DEFAULT_MAX_ATTEMPTS, deadline_seconds: float = DEFAULT_DEADLINE_SECONDS):
+    """
+    Streaming variant of generate_content(): yields text chunks as they arrive.
+    Failures before the first chunk are retried under the same policy; once text has been
+    yielded an error is raised to the caller, since a retry would repeat the answer.
+    The deadline covers the whole stream - the generator stops with GeminiUnavailable when it passes.
+    """
+    if not _breaker_allows():
+        raise GeminiUnavailable("Gemini temporarily unavailable (circuit breaker open)")
+
+    deadline = time.monotonic() + deadline_seconds
+    last_error = None
+    for attempt in range(max(1, max_attempts)):
+        remaining = deadline - time.monotonic()
+        if remaining < MIN_ATTEMPT_SECONDS:
+            break
+
+        timeout_options = types.HttpOptions(timeout=int(remaining * 1000))
+        call_config = (config.model_copy(update={'http_options': timeout_options}) if config
+                       else types.GenerateContentConfig(http_options=timeout_options))
+        client = None
+        started = False
+        try:
+            client = get_client()
+            for chunk in client.models.generate_content_stream(model=model, contents=contents, config=call_config):
+                if chunk.text:
+                    if not started:
+                        started = True
+                        _record_result(True)
+                    yield chunk.text
+                if time.monotonic() > deadline:
+                    raise GeminiUnavailable(f"Gemini answer cut off after {deadline_seconds:.0f}s")
+            if not started:
+                _record_result(True)
+            return
+        except GeminiUnavailable:
+            # Deadline hit before any text: count the failure (also ends a half-open probe)
+            if not started:
+                _record_result(False)
+            raise
+        except Exception as e:
+            last_error = e
+            kind = classify_error(e)
+            if kind == 'connection':
+                report_connection_error(client)
+            if started or kind == 'fatal':
+                if kind == 'fatal' and not started:
+                    _record_result(True)
+                raise
+            if attempt < max_attempts - 1:
+                delay = _backoff_seconds(attempt, e)
+                if time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline:
+                    break
+                time.sleep(delay)
+
+    _record_result(False)
+    if last_error is None:
+        raise GeminiUnavailable(f"Gemini deadline of {deadline_seconds:.0f}s reached")
+    raise GeminiUnavailable(f"Gemini call failed after {attempt + 1} attempt(s): {last_error}") from last_error
@@ -2,43 +2,115 @@
 Hotel Resolver using Google Places API
 Fetches hotel details and photos, saves images locally for PDF generation
 With database caching to avoid repeated API calls
+Photos live in a content-addressed store shared by all cache entries
+
+Bulk pre-fill of the cache from a CSV of hotel queries:
+    python hotel_resolver.py prefill hotels.csv --column query --workers 4
 """
 
+import argparse
+import csv
+import hashlib
+import json
 import os
 import requests
+import shutil
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
 
+import rate_limiter
+
 
 GOOGLE_PLACES_API_KEY = os.environ.get('GOOGLE_PLACES_API_KEY', '')
 HOTELS_DIR = Path('attached_assets/hotels')
 REQUEST_TIMEOUT = 10
 
+# Hotel photos are shown at most full content width on an A4 PDF page;
+# 1200px keeps them sharp in print without carrying the full 1600px original
+PHOTO_MAX_WIDTH = 1200
+PHOTO_JPEG_QUALITY = 85
+PHOTO_CHUNK_SIZE = 64 * 1024
+
+# Cache lifetimes: found hotels, queries that found nothing, and how often image files are re-checked
+HOTEL_CACHE_DAYS = 90
+NEGATIVE_CACHE_HOURS = 6
+FILE_CHECK_HOURS = 24
+
+# Content-addressed photo store: blobs/<first 2 hex>/<sha256>.jpg
+BLOBS_DIR = HOTELS_DIR / 'blobs'
+INCOMING_DIR = HOTELS_DIR / 'incoming'
+GC_INTERVAL_HOURS = 24
+BLOB_GRACE_HOURS = 24
+
+# Concurrent lookups in resolve_hotels_batch (calls still go through the google_places rate limiter)
+BATCH_WORKERS = 4
+
+_photo_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hotel-photo')
+_last_gc = 0.0
+
+
+class PlacesQuotaExceeded(Exception):
+    """Google Places request budget is used up (locally or OVER_QUERY_LIMIT from Google)"""
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a hotel query: lowercase with collapsed whitespace"""
+    return ' '.join(query.lower().split())
+
+
+def _cache_expiry(cached) -> datetime:
+    """When a HotelCache row expires (rows from before TTLs count from created_at)"""
+    if cached.expires_at:
+        return cached.expires_at
+    ttl = timedelta(hours=NEGATIVE_CACHE_HOURS) if cached.is_negative else timedelta(days=HOTEL_CACHE_DAYS)
+    return (cached.created_at or datetime.utcnow()) + ttl
+
 
 def get_cached_hotel(query: str):
-    """Check if hotel is in cache. Returns None if images are missing (to trigger re-download)."""
+    """
+    Check if hotel is in cache. Returns None if expired or images are missing (to trigger re-download).
+    A recent failed lookup returns the not-found error without calling Google again.
+    Image files are checked at most once per FILE_CHECK_HOURS.
+    """
     try:
         from models import get_db, HotelCache
         db = get_db()
         if db:
-            normalized_query = query.strip().lower()
+            normalized_query = normalize_query(query)
             cached = db.query(HotelCache).filter(
                 HotelCache.search_query == normalized_query
             ).first()
             
             if cached:
-                has_image_1 = cached.hotel_image_path and os.path.exists(cached.hotel_image_path)
-                
-                if not has_image_1:
-                    db.delete(cached)
-                    db.commit()
+                now = datetime.utcnow()
+                if _cache_expiry(cached) <= now:
                     db.close()
                     return None
                 
+                if cached.is_negative:
+                    db.close()
+                    return {'error': 'מלון לא נמצא', 'status': 404, 'from_cache': True}
+                
+                if not cached.files_checked_at or now - cached.files_checked_at > timedelta(hours=FILE_CHECK_HOURS):
+                    has_image_1 = cached.hotel_image_path and os.path.exists(cached.hotel_image_path)
+                    
+                    if not has_image_1:
+                        _change_blob_refs(db, [cached.hotel_image_path, cached.hotel_image_path_2], -1)
+                        db.delete(cached)
+                        db.commit()
+                        db.close()
+                        return None
+                    
+                    if cached.hotel_image_path_2 and not os.path.exists(cached.hotel_image_path_2):
+                        _change_blob_refs(db, [cached.hotel_image_path_2], -1)
+                        cached.hotel_image_path_2 = None
+                    cached.files_checked_at = now
+                    db.commit()
+                
                 result = cached.to_dict()
-                result['hotel_image_path'] = cached.hotel_image_path
-                if cached.hotel_image_path_2 and os.path.exists(cached.hotel_image_path_2):
-                    result['hotel_image_path_2'] = cached.hotel_image_path_2
                 result['from_cache'] = True
                 db.close()
                 return result
@@ -48,30 +120,96 @@ def get_cached_hotel(query: str):
     return None
 
 
+def get_cached_place(place_id: str):
+    """Find a cached hotel by Google place_id (any query spelling), so its photos can be reused"""
+    try:
+        from models import get_db, HotelCache
+        db = get_db()
+        if db:
+            rows = db.query(HotelCache).filter(
+                HotelCache.place_id == place_id,
+                HotelCache.is_negative.isnot(True)
+            ).all()
+            db.close()
+            now = datetime.utcnow()
+            for cached in rows:
+                if _cache_expiry(cached) <= now:
+                    continue
+                if cached.hotel_image_path and os.path.exists(cached.hotel_image_path):
+                    result = cached.to_dict()
+                    if not (cached.hotel_image_path_2 and os.path.exists(cached.hotel_image_path_2)):
+                        result['hotel_image_path_2'] = None
+                    return result
+    except Exception as e:
+        print(f"Cache lookup error: {e}")
+    return None
+
+
 def save_to_cache(query: str, result: dict, place_id: str = None):
-    """Save hotel result to cache"""
+    """Save hotel result to cache (replacing an expired or negative entry for the same query)"""
     try:
         from models import get_db, HotelCache
         db = get_db()
         if db:
-            normalized_query = query.strip().lower()
+            normalized_query = normalize_query(query)
             existing = db.query(HotelCache).filter(
                 HotelCache.search_query == normalized_query
             ).first()
             
             if not existing:
-                cache_entry = HotelCache(
-                    search_query=normalized_query,
-                    hotel_name=result.get('hotel_name'),
-                    hotel_address=result.get('hotel_address'),
-                    hotel_website=result.get('hotel_website'),
-                    hotel_rating=result.get('hotel_rating'),
-                    hotel_image_path=result.get('hotel_image_path'),
-                    hotel_image_path_2=result.get('hotel_image_path_2'),
-                    place_id=place_id
-                )
-                db.add(cache_entry)
-                db.commit()
+                existing = HotelCache(search_query=normalized_query)
+                db.add(existing)
+            else:
+                _change_blob_refs(db, [existing.hotel_image_path, existing.hotel_image_path_2], -1)
+            
+            now = datetime.utcnow()
+            existing.hotel_name = result.get('hotel_name')
+            existing.hotel_address = result.get('hotel_address')
+            existing.hotel_website = result.get('hotel_website')
+            existing.hotel_rating = result.get('hotel_rating')
+            existing.hotel_image_path = result.get('hotel_image_path')
+            existing.hotel_image_path_2 = result.get('hotel_image_path_2')
+            existing.place_id = place_id
+            existing.is_negative = False
+            existing.created_at = now
+            existing.expires_at = now + timedelta(days=HOTEL_CACHE_DAYS)
+            existing.files_checked_at = now
+            _change_blob_refs(db, [existing.hotel_image_path, existing.hotel_image_path_2], 1)
+            db.commit()
+            db.close()
+    except Exception as e:
+        print(f"Cache save error: {e}")
+
+
+def save_negative_to_cache(query: str):
+    """Remember that a query found no hotel, for NEGATIVE_CACHE_HOURS"""
+    try:
+        from models import get_db, HotelCache
+        db = get_db()
+        if db:
+            normalized_query = normalize_query(query)
+            existing = db.query(HotelCache).filter(
+                HotelCache.search_query == normalized_query
+            ).first()
+            
+            if not existing:
+                existing = HotelCache(search_query=normalized_query)
+                db.add(existing)
+            else:
+                _change_blob_refs(db, [existing.hotel_image_path, existing.hotel_image_path_2], -1)
+            
+            now = datetime.utcnow()
+            existing.hotel_name = None
+            existing.hotel_address = None
+            existing.hotel_website = None
+            existing.hotel_rating = None
+            existing.hotel_image_path = None
+            existing.hotel_image_path_2 = None
+            existing.place_id = None
+            existing.is_negative = True
+            existing.created_at = now
+            existing.expires_at = now + timedelta(hours=NEGATIVE_CACHE_HOURS)
+            db.commit()
             db.close()
     except Exception as e:
         print(f"Cache save error: {e}")
@@ -80,11 +218,222 @@ def save_to_cache(query: str, result: dict, place_id: str = None):
 def ensure_hotels_dir():
     """Create hotels directory if it doesn't exist"""
     HOTELS_DIR.mkdir(parents=True, exist_ok=True)
+    BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def find_place_id(query: str) -> str | None:
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(PHOTO_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _blob_path(content_hash: str) -> Path:
+    return BLOBS_DIR / content_hash[:2] / f"{content_hash}.jpg"
+
+
+def _change_blob_refs(db, paths: list, delta: int):
+    """Adjust reference counts of the blobs behind the given image paths (caller commits)"""
+    from models import HotelImageBlob
+    paths = [p for p in paths if p]
+    if not paths:
+        return
+    blobs = db.query(HotelImageBlob).filter(HotelImageBlob.path.in_(paths))
+    blobs.update({HotelImageBlob.ref_count: HotelImageBlob.ref_count + delta}, synchronize_session=False)
+    if delta < 0:
+        blobs.filter(HotelImageBlob.ref_count <= 0, HotelImageBlob.unreferenced_at.is_(None)).update(
+            {HotelImageBlob.unreferenced_at: datetime.utcnow()}, synchronize_session=False
+        )
+    else:
+        blobs.filter(HotelImageBlob.unreferenced_at.isnot(None)).update(
+            {HotelImageBlob.unreferenced_at: None}, synchronize_session=False
+        )
+
+
+def store_image_blob(file_path: Path) -> str:
     """
-    Find Place From Text API - returns place_id for the first result
+    Move a downloaded image into the content-addressed store.
+    Identical photos (same bytes) end up as one shared file.
+    
+    Returns:
+        Path of the shared blob
+    """
+    content_hash = _hash_file(file_path)
+    dest = _blob_path(content_hash)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    size = file_path.stat().st_size
+    
+    # Register (or revive) the blob first, so a concurrent GC no longer treats it as unreferenced
+    try:
+        from models import get_db, HotelImageBlob
+        from sqlalchemy.exc import IntegrityError
+        db = get_db()
+        if db:
+            try:
+                blob = db.query(HotelImageBlob).filter(HotelImageBlob.content_hash == content_hash).first()
+                if blob:
+                    blob.unreferenced_at = None
+                else:
+                    db.add(HotelImageBlob(content_hash=content_hash, path=str(dest), size_bytes=size))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+            finally:
+                db.close()
+    except Exception as e:
+        print(f"Image blob register error: {e}")
+    
+    # Same hash means same bytes - always replacing keeps the file even if GC just removed it
+    os.replace(file_path, dest)
+    return str(dest)
+
+
+def _download_photo_blob(photo_reference: str) -> str | None:
+    """Download a Places photo and store it as a shared blob"""
+    incoming_path = INCOMING_DIR / f"{uuid.uuid4().hex}.jpg"
+    if not download_place_photo(photo_reference, incoming_path):
+        return None
+    try:
+        return store_image_blob(incoming_path)
+    except OSError as e:
+        print(f"Error storing photo: {e}")
+        incoming_path.unlink(missing_ok=True)
+        return None
+
+
+def _package_image_paths(db) -> set:
+    """Image paths referenced from saved package templates (these keep blobs alive too)"""
+    from models import PackageTemplate
+    paths = set()
+    for (hotel_data,) in db.query(PackageTemplate.hotel_data).filter(PackageTemplate.hotel_data.isnot(None)).all():
+        try:
+            hotel = json.loads(hotel_data)
+        except (TypeError, ValueError):
+            continue
+        for key in ('image_path', 'image_path_2', 'hotel_image_path', 'hotel_image_path_2'):
+            if hotel.get(key):
+                paths.add(hotel[key])
+    return paths
+
+
+def collect_hotel_image_garbage() -> int:
+    """
+    Garbage-collect the hotel photo store.
+    Recounts references from HotelCache rows (fixing any drift), moves legacy
+    per-order images into the shared store, and deletes blobs that nothing
+    references (HotelCache or package templates) once they have been unreferenced
+    for BLOB_GRACE_HOURS. Stray files left in the store without a row are removed too.
+    
+    Returns:
+        Number of files deleted
+    """
+    from models import get_db, HotelCache, HotelImageBlob
+    db = get_db()
+    if not db:
+        return 0
+    
+    deleted = 0
+    try:
+        ensure_hotels_dir()
+        blobs_root = str(BLOBS_DIR)
+        
+        # Move legacy {order_id}_{n}.jpg images into the store
+        for row in db.query(HotelCache).all():
+            for attr in ('hotel_image_path', 'hotel_image_path_2'):
+                path = getattr(row, attr)
+                if path and not path.startswith(blobs_root) and os.path.exists(path):
+                    incoming_path = INCOMING_DIR / f"{uuid.uuid4().hex}.jpg"
+                    shutil.copyfile(path, incoming_path)
+                    setattr(row, attr, store_image_blob(incoming_path))
+        db.commit()
+        
+        counts = {}
+        for row in db.query(HotelCache).all():
+            for path in (row.hotel_image_path, row.hotel_image_path_2):
+                if path:
+                    counts[path] = counts.get(path, 0) + 1
+        package_paths = _package_image_paths(db)
+        
+        now = datetime.utcnow()
+        cutoff = now - timedelta(hours=BLOB_GRACE_HOURS)
+        known_paths = set()
+        expired = []
+        for blob in db.query(HotelImageBlob).all():
+            blob.ref_count = counts.get(blob.path, 0)
+            if blob.ref_count > 0 or blob.path in package_paths:
+                blob.unreferenced_at = None
+            elif blob.unreferenced_at is None:
+                blob.unreferenced_at = now
+            if blob.unreferenced_at is not None and blob.unreferenced_at < cutoff:
+                expired.append((blob.id, blob.path))
+            else:
+                known_paths.add(blob.path)
+        db.commit()
+        
+        for blob_id, path in expired:
+            # Delete only if still unreferenced - store_image_blob may have revived it meanwhile
+            removed = db.query(HotelImageBlob).filter(
+                HotelImageBlob.id == blob_id,
+                HotelImageBlob.ref_count == 0,
+                HotelImageBlob.unreferenced_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            if removed:
+                Path(path).unlink(missing_ok=True)
+                deleted += 1
+            else:
+                known_paths.add(path)
+        
+        stale_before = time.time() - BLOB_GRACE_HOURS * 3600
+        for path in list(BLOBS_DIR.glob('*/*.jpg')) + list(INCOMING_DIR.glob('*')):
+            referenced = str(path) in known_paths or str(path) in counts or str(path) in package_paths
+            if not referenced and path.stat().st_mtime < stale_before:
+                path.unlink(missing_ok=True)
+                deleted += 1
+    except Exception as e:
+        db.rollback()
+        print(f"Hotel image GC error: {e}")
+    finally:
+        db.close()
+    
+    return deleted
+
+
+def _maybe_collect_garbage():
+    """Run the photo store GC in the background at most once per GC_INTERVAL_HOURS per process"""
+    global _last_gc
+    now = time.time()
+    if now - _last_gc < GC_INTERVAL_HOURS * 3600:
+        return
+    _last_gc = now
+    _photo_executor.submit(collect_hotel_image_garbage)
+
+
+def _places_get(url: str, params: dict, **kwargs):
+    """GET a Google Places endpoint after taking a token from the shared rate limiter"""
+    if not rate_limiter.acquire('google_places'):
+        raise PlacesQuotaExceeded("Google Places request budget exhausted")
+    response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT, **kwargs)
+    if response.status_code == 429:
+        rate_limiter.report_rate_limited('google_places')
+    return response
+
+
+def _check_places_status(data: dict):
+    """Raise for Google Places statuses that are errors rather than 'no such place'"""
+    status = data.get('status')
+    if status == 'OVER_QUERY_LIMIT':
+        rate_limiter.report_rate_limited('google_places')
+        raise PlacesQuotaExceeded("Google Places OVER_QUERY_LIMIT")
+    if status in ('REQUEST_DENIED', 'INVALID_REQUEST', 'UNKNOWN_ERROR'):
+        raise ValueError(f"Google Places error: {status} {data.get('error_message', '')}".strip())
+
+
+def find_place(query: str) -> dict | None:
+    """
+    Find Place From Text API - returns place_id and the first photo reference for the first result
     """
     if not GOOGLE_PLACES_API_KEY:
         raise ValueError("GOOGLE_PLACES_API_KEY not configured")
@@ -93,18 +442,34 @@ def find_place_id(query: str) -> str | None:
     params = {
         'input': query,
         'inputtype': 'textquery',
-        'fields': 'place_id',
+        'fields': 'place_id,photos',
         'key': GOOGLE_PLACES_API_KEY
     }
     
-    response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    response = _places_get(url, params)
     response.raise_for_status()
     data = response.json()
+    _check_places_status(data)
     
     if data.get('status') != 'OK' or not data.get('candidates'):
         return None
     
-    return data['candidates'][0].get('place_id')
+    candidate = data['candidates'][0]
+    if not candidate.get('place_id'):
+        return None
+    photos = candidate.get('photos') or [{}]
+    return {
+        'place_id': candidate['place_id'],
+        'photo_reference': photos[0].get('photo_reference')
+    }
+
+
+def find_place_id(query: str) -> str | None:
+    """
+    Find Place From Text API - returns place_id for the first result
+    """
+    place = find_place(query)
+    return place['place_id'] if place else None
 
 
 def get_place_details(place_id: str) -> dict | None:
@@ -121,9 +486,10 @@ def get_place_details(place_id: str) -> dict | None:
         'key': GOOGLE_PLACES_API_KEY
     }
     
-    response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    response = _places_get(url, params)
     response.raise_for_status()
     data = response.json()
+    _check_places_status(data)
     
     if data.get('status') != 'OK' or not data.get('result'):
         return None
@@ -138,31 +504,51 @@ def get_place_details(place_id: str) -> dict | None:
     }
 
 
+def _shrink_photo(download_path: Path, save_path: Path):
+    """Downscale a downloaded photo to PHOTO_MAX_WIDTH and store it as JPEG"""
+    from PIL import Image
+    
+    with Image.open(download_path) as img:
+        if img.format == 'JPEG' and img.width <= PHOTO_MAX_WIDTH:
+            img.close()
+            os.replace(download_path, save_path)
+            return
+        # Let the JPEG decoder skip detail we are about to throw away
+        img.draft('RGB', (PHOTO_MAX_WIDTH, PHOTO_MAX_WIDTH))
+        photo = img.convert('RGB')
+    photo.thumbnail((PHOTO_MAX_WIDTH, PHOTO_MAX_WIDTH * 4))
+    photo.save(save_path, 'JPEG', quality=PHOTO_JPEG_QUALITY, optimize=True)
+    download_path.unlink(missing_ok=True)
+
+
 def download_place_photo(photo_reference: str, save_path: Path) -> bool:
     """
-    Download a photo from Google Places Photo API and save locally
+    Download a photo from Google Places Photo API and save locally.
+    The response is streamed to disk in chunks, then resized to the size the PDF uses.
     """
     if not GOOGLE_PLACES_API_KEY:
         return False
     
     url = "https://maps.googleapis.com/maps/api/place/photo"
     params = {
-        'maxwidth': 1600,
+        'maxwidth': PHOTO_MAX_WIDTH,
         'photo_reference': photo_reference,
         'key': GOOGLE_PLACES_API_KEY
     }
     
+    download_path = Path(f"{save_path}.part")
     try:
-        response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT, allow_redirects=True)
-        response.raise_for_status()
-        
-        # Save the image bytes
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        with _places_get(url, params, allow_redirects=True, stream=True) as response:
+            response.raise_for_status()
+            with open(download_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=PHOTO_CHUNK_SIZE):
+                    f.write(chunk)
         
+        _shrink_photo(download_path, save_path)
         return True
     except Exception as e:
         print(f"Error downloading photo: {e}")
+        download_path.unlink(missing_ok=True)
         return False
 
 
@@ -172,7 +558,7 @@ def resolve_hotel(query: str, order_id: str = None) -> dict:
     
     Args:
         query: Hotel name + city (e.g., "Hilton Madrid, Madrid")
-        order_id: Optional order ID for naming saved images
+        order_id: Unused, kept for compatibility (images are stored by content hash)
     
     Returns:
         dict with hotel info and local image paths
@@ -183,17 +569,28 @@ def resolve_hotel(query: str, order_id: str = None) -> dict:
         return cached
     
     ensure_hotels_dir()
+    _maybe_collect_garbage()
     
-    # Generate unique ID if not provided
-    if not order_id:
-        order_id = uuid.uuid4().hex[:8]
-    
-    # Step 1: Find place_id
-    place_id = find_place_id(query)
-    if not place_id:
+    # Step 1: Find place_id (and the main photo, so its download can start right away)
+    place = find_place(query)
+    if not place:
+        save_negative_to_cache(query)
         return {'error': 'מלון לא נמצא', 'status': 404}
+    place_id = place['place_id']
+    
+    # Same hotel already resolved under another spelling - share its data and photos
+    cached_place = get_cached_place(place_id)
+    if cached_place:
+        save_to_cache(query, cached_place, place_id)
+        cached_place['from_cache'] = True
+        return cached_place
     
-    # Step 2: Get place details
+    downloads = {}
+    if place.get('photo_reference'):
+        downloads[0] = _photo_executor.submit(_download_photo_blob, place['photo_reference'])
+    
+    # Step 2: Get place details while the main photo downloads
+    # (if this fails, an already stored photo is left unreferenced for the GC)
     details = get_place_details(place_id)
     if not details:
         return {'error': 'לא ניתן לקבל פרטי מלון', 'status': 500}
@@ -207,22 +604,22 @@ def resolve_hotel(query: str, order_id: str = None) -> dict:
         'hotel_image_path_2': None
     }
     
-    # Step 3: Download photos (up to 2)
+    # Step 3: Download remaining photos (up to 2 in total) in parallel
     photos = details.get('photos', [])
     
     for i, photo in enumerate(photos[:2]):
         photo_ref = photo.get('photo_reference')
-        if not photo_ref:
+        if i in downloads or not photo_ref:
             continue
-        
-        # Save path
-        save_path = HOTELS_DIR / f"{order_id}_{i+1}.jpg"
-        
-        if download_place_photo(photo_ref, save_path):
+        downloads[i] = _photo_executor.submit(_download_photo_blob, photo_ref)
+    
+    for i, future in sorted(downloads.items()):
+        blob_path = future.result()
+        if blob_path:
             if i == 0:
-                result['hotel_image_path'] = str(save_path)
+                result['hotel_image_path'] = blob_path
             else:
-                result['hotel_image_path_2'] = str(save_path)
+                result['hotel_image_path_2'] = blob_path
     
     # Save to cache for future lookups
     save_to_cache(query, result, place_id)
@@ -238,9 +635,95 @@ def resolve_hotel_safe(query: str, order_id: str = None) -> dict:
         return resolve_hotel(query, order_id)
     except ValueError as e:
         return {'error': str(e), 'status': 400}
+    except PlacesQuotaExceeded:
+        return {'error': 'חריגה ממכסת Google Places, נסה שוב מאוחר יותר', 'status': 429}
     except requests.exceptions.Timeout:
         return {'error': 'תם הזמן לחיבור ל-Google Places', 'status': 504}
     except requests.exceptions.RequestException as e:
         return {'error': f'שגיאת רשת: {str(e)}', 'status': 500}
     except Exception as e:
         return {'error': f'שגיאה לא צפויה: {str(e)}', 'status': 500}
+
+
+def resolve_hotels_batch(queries: list, max_workers: int = BATCH_WORKERS) -> dict:
+    """
+    Resolve many hotels in one call (e.g. a season of package templates).
+    Queries that normalize to the same cache key are looked up once.
+    
+    Args:
+        queries: Hotel queries ("Hotel name, City")
+        max_workers: Lookups run concurrently, each call still waits for a rate limiter token
+    
+    Returns:
+        dict mapping every given query to its resolve_hotel_safe() result
+    """
+    unique = {}
+    for query in queries:
+        if query and query.strip():
+            unique.setdefault(normalize_query(query), query.strip())
+    
+    results = {}
+    if unique:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='hotel-batch') as pool:
+            futures = {pool.submit(resolve_hotel_safe, query): key for key, query in unique.items()}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    
+    return {
+        query: results.get(normalize_query(query or ''), {'error': 'שאילתה ריקה', 'status': 400})
+        for query in queries
+    }
+
+
+def prefill_cache_from_csv(csv_path: str, column: str = 'query', max_workers: int = BATCH_WORKERS) -> dict:
+    """
+    Fill HotelCache in advance from a CSV file.
+    Reads `column` if the file has that header, otherwise the first column of every row.
+    
+    Returns:
+        dict with counts: total, cached (already in cache), resolved, not_found, failed
+    """
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.reader(f))
+    if not rows:
+        return {'total': 0, 'cached': 0, 'resolved': 0, 'not_found': 0, 'failed': 0}
+    
+    header = [h.strip().lower() for h in rows[0]]
+    if column.lower() in header:
+        index = header.index(column.lower())
+        rows = rows[1:]
+    else:
+        index = 0
+    queries = [row[index].strip() for row in rows if len(row) > index and row[index].strip()]
+    
+    results = resolve_hotels_batch(queries, max_workers=max_workers)
+    summary = {'total': len(results), 'cached': 0, 'resolved': 0, 'not_found': 0, 'failed': 0}
+    for query, result in results.items():
+        if result.get('status') == 404:
+            summary['not_found'] += 1
+        elif result.get('error'):
+            summary['failed'] += 1
+            print(f"{query}: {result['error']}")
+        elif result.get('from_cache'):
+            summary['cached'] += 1
+        else:
+            summary['resolved'] += 1
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hotel cache maintenance")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('gc', help="Delete hotel images no cache entry or package references")
+    prefill = subparsers.add_parser('prefill', help="Resolve every hotel in a CSV into HotelCache")
+    prefill.add_argument('csv_path')
+    prefill.add_argument('--column', default='query', help="Header of the query column (default: first column)")
+    prefill.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+    
+    if args.command == 'gc':
+        print(f"Deleted {collect_hotel_image_garbage()} unreferenced hotel images")
+    else:
+        summary = prefill_cache_from_csv(args.csv_path, column=args.column, max_workers=args.workers)
+        print(f"{summary['total']} hotels: {summary['resolved']} resolved, {summary['cached']} already cached, "
+              f"{summary['not_found']} not found, {summary['failed']} failed")
@@ -0,0 +1,211 @@
+"""
+HTTP Record/Replay Harness
+Captures real responses from external APIs (Ticketmaster, RapidAPI, Google Places,
+openfootball, Bank of Israel) into fixture files and replays them offline,
+with optional latency injection, for benchmarking the service modules.
+
+Works by hooking requests.Session.send, so every module using `requests` is covered.
+
+Usage:
+    with use_http_replay('record', 'http_fixtures'):
+        search_events_combined('Coldplay', 'K8vZ9171izV')
+
+    with use_http_replay('replay', 'http_fixtures', latency_ms=150):
+        search_events_combined('Coldplay', 'K8vZ9171izV')
+
+Or set HTTP_REPLAY_MODE=record|replay (plus HTTP_REPLAY_DIR, HTTP_REPLAY_LATENCY_MS)
+and start the app - app.py calls install_from_env() at startup.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_FIXTURES_DIR = 'http_fixtures'
+
+# Credentials are stripped from URLs before matching and never written to fixtures
+REDACTED_PARAMS = {'apikey', 'api_key', 'key', 'token', 'access_token'}
+SKIPPED_RESPONSE_HEADERS = {'set-cookie', 'content-encoding', 'transfer-encoding', 'content-length'}
+
+_original_send = requests.Session.send
+_config = None
+_config_lock = threading.Lock()
+
+
+class ReplayMissError(requests.exceptions.ConnectionError):
+    """No fixture recorded for a request in replay mode"""
+
+
+def _normalize_url(url: str) -> str:
+    """URL used for matching: secrets removed, query sorted, no fragment"""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in REDACTED_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+def _request_key(request) -> tuple:
+    """Match key and fixture file name for a prepared request"""
+    url = _normalize_url(request.url)
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha256(f"{request.method} {url}".encode('utf-8') + b'\n' + body).hexdigest()
+    host = urlsplit(url).netloc.replace(':', '_') or 'local'
+    return url, f"{host}_{digest[:16]}.json"
+
+
+def _save_fixture(fixtures_dir: Path, request, response):
+    url, filename = _request_key(request)
+    fixture = {
+        'request': {'method': request.method, 'url': url},
+        'response': {
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'url': _normalize_url(response.url),
+            'encoding': response.encoding,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_RESPONSE_HEADERS},
+            'body': base64.b64encode(response.content).decode('ascii'),
+            'elapsed_ms': round(response.elapsed.total_seconds() * 1000, 1)
+        }
+    }
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = fixtures_dir / f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, indent=2)
+    os.replace(tmp_path, fixtures_dir / filename)
+
+
+def _load_response(fixtures_dir: Path, request) -> tuple:
+    """Build a requests.Response from a fixture; returns (response, recorded latency in ms)"""
+    url, filename = _request_key(request)
+    path = fixtures_dir / filename
+    if not path.exists():
+        raise ReplayMissError(f"No recorded response for {request.method} {url}", request=request)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        fixture = json.load(f)['response']
+
+    response = requests.Response()
+    response.status_code = fixture['status_code']
+    response.reason = fixture.get('reason')
+    response.url = request.url
+    response.encoding = fixture.get('encoding')
+    response.headers = CaseInsensitiveDict(fixture.get('headers', {}))
+    response._content = base64.b64decode(fixture['body'])
+    response._content_consumed = True
+    response.request = request
+    response.elapsed = timedelta(milliseconds=fixture.get('elapsed_ms', 0))
+    return response, fixture.get('elapsed_ms', 0)
+
+
+def _replay_latency(config: dict, recorded_ms: float) -> float:
+    """Seconds to sleep before returning a replayed response"""
+    if config['latency_ms'] is None:
+        base_ms = recorded_ms * config['latency_scale']
+    else:
+        base_ms = config['latency_ms']
+    if config['jitter_ms']:
+        with _config_lock:
+            base_ms += config['rng'].uniform(0, config['jitter_ms'])
+    return max(0.0, base_ms) / 1000
+
+
+def _send(session, request, **kwargs):
+    config = _config
+    if not config:
+        return _original_send(session, request, **kwargs)
+
+    if config['mode'] == 'replay':
+        response, recorded_ms = _load_response(config['dir'], request)
+        delay = _replay_latency(config, recorded_ms)
+        if delay:
+            time.sleep(delay)
+        return response
+
+    response = _original_send(session, request, **kwargs)
+    # Reading .content consumes streamed bodies; iter_content() then reuses the buffer
+    response.content
+    _save_fixture(config['dir'], request, response)
+    return response
+
+
+def install(mode: str, fixtures_dir: str = DEFAULT_FIXTURES_DIR, latency_ms: float = None,
+            latency_scale: float = 1.0, jitter_ms: float = 0, seed: int = 0):
+    """
+    Start recording or replaying all HTTP traffic made through `requests`.
+
+    Args:
+        mode: 'record' (call the real API and save responses) or 'replay' (serve saved responses only)
+        fixtures_dir: Directory holding one JSON fixture per request
+        latency_ms: Fixed delay per replayed response; None replays the recorded latency
+        latency_scale: Multiplier for recorded latency when latency_ms is None
+        jitter_ms: Extra random delay (0..jitter_ms), seeded so runs are reproducible
+        seed: Seed for the jitter generator
+    """
+    global _config
+    if mode not in ('record', 'replay'):
+        raise ValueError(f"Unknown HTTP replay mode: {mode}")
+
+    _config = {
+        'mode': mode,
+        'dir': Path(fixtures_dir),
+        'latency_ms': latency_ms,
+        'latency_scale': latency_scale,
+        'jitter_ms': jitter_ms,
+        'rng': random.Random(seed)
+    }
+    requests.Session.send = _send
+
+
+def uninstall():
+    """Restore normal network access"""
+    global _config
+    _config = None
+    requests.Session.send = _original_send
+
+
+@contextmanager
+def use_http_replay(mode: str, fixtures_dir: str = DEFAULT_FIXTURES_DIR, **kwargs):
+    """Context manager around install()/uninstall()"""
+    install(mode, fixtures_dir, **kwargs)
+    try:
+        yield
+    finally:
+        uninstall()
+
+
+def install_from_env() -> bool:
+    """
+    Install the harness from HTTP_REPLAY_MODE, HTTP_REPLAY_DIR, HTTP_REPLAY_LATENCY_MS
+    and HTTP_REPLAY_JITTER_MS. Does nothing unless HTTP_REPLAY_MODE is set, or if the
+    harness is already installed (safe to call on every Streamlit rerun).
+
+    Returns:
+        True if the harness was installed
+    """
+    mode = os.environ.get('HTTP_REPLAY_MODE', '').strip().lower()
+    if mode not in ('record', 'replay'):
+        return False
+    if _config is not None:
+        return True
+
+    latency = os.environ.get('HTTP_REPLAY_LATENCY_MS', '').strip()
+    install(
+        mode,
+        os.environ.get('HTTP_REPLAY_DIR', DEFAULT_FIXTURES_DIR),
+        latency_ms=float(latency) if latency else None,
+        jitter_ms=float(os.environ.get('HTTP_REPLAY_JITTER_MS', 0) or 0)
+    )
+    print(f"HTTP replay harness active: {mode} ({os.environ.get('HTTP_REPLAY_DIR', DEFAULT_FIXTURES_DIR)})")
+    return True
@@ -1,6 +1,7 @@
 import os
+import re
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, Enum as SQLEnum, text, LargeBinary
+from sqlalchemy import event, create_engine, Column, Integer, String, Text, Float, Date, DateTime, Boolean, UniqueConstraint, ForeignKey, Enum as SQLEnum, text, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import enum
@@ -122,9 +123,36 @@ class Order(Base):
     
     notes = Column(Text, nullable=True)
     
+    # Normalized customer/event/number/email text for the trigram search index (see order_search.py)
+    search_text = Column(Text, nullable=True)
+    
     def __repr__(self):
         return f"<Order {self.order_number}: {self.customer_name}>"
 
+
+_NIQQUD_RE = re.compile(r'[\u0591-\u05C7]')
+_FINAL_LETTERS = str.maketrans({'ך': 'כ', 'ם': 'מ', 'ן': 'נ', 'ף': 'פ', 'ץ': 'צ'})
+_SEARCH_SEPARATORS_RE = re.compile(r'[^\w@.\-]+')
+
+
+def normalize_search_text(text: str) -> str:
+    """Lowercase, drop niqqud and quote marks (ת"א = תא), unify Hebrew final letters and collapse separators"""
+    text = _NIQQUD_RE.sub('', text or '').lower().translate(_FINAL_LETTERS)
+    text = re.sub(r'["\'׳״`]', '', text)
+    return ' '.join(_SEARCH_SEPARATORS_RE.sub(' ', text).split())
+
+
+def build_order_search_text(order) -> str:
+    return normalize_search_text(' '.join(
+        value or '' for value in (order.customer_name, order.event_name, order.order_number, order.customer_email)
+    ))
+
+
+@event.listens_for(Order, 'before_insert')
+@event.listens_for(Order, 'before_update')
+def _update_order_search_text(mapper, connection, order):
+    order.search_text = build_order_search_text(order)
+
 class EventTemplate(Base):
     __tablename__ = "event_templates"
     
@@ -170,6 +198,9 @@ class HotelCache(Base):
     hotel_image_path_2 = Column(String(500))
     place_id = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+    is_negative = Column(Boolean, default=False)
+    files_checked_at = Column(DateTime, nullable=True)
     
     def __repr__(self):
         return f"<HotelCache {self.hotel_name}>"
@@ -184,6 +215,22 @@ class HotelCache(Base):
             'hotel_image_path_2': self.hotel_image_path_2
         }
 
+class HotelImageBlob(Base):
+    """Content-addressed hotel photo shared by every HotelCache row that shows it"""
+    __tablename__ = "hotel_image_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False, index=True)
+    path = Column(String(500), unique=True, nullable=False, index=True)
+    size_bytes = Column(Integer, default=0)
+    ref_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # When ref_count last dropped to 0 - the GC grace period counts from here
+    unreferenced_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<HotelImageBlob {self.content_hash[:12]} refs={self.ref_count}>"
+
 class ConcertCache(Base):
     """Cache for concert search results to avoid repeated API calls - shared across all users"""
     __tablename__ = "concert_cache"
@@ -197,10 +244,85 @@ class ConcertCache(Base):
     source = Column(String(50))
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime)
+    hit_count = Column(Integer, default=0)
+    last_accessed_at = Column(DateTime, nullable=True)
     
     def __repr__(self):
         return f"<ConcertCache {self.artist_name} ({self.total_results} concerts)>"
 
+class ConcertUrlCache(Base):
+    """Cache for concert details extracted from event page URLs - shared across all users"""
+    __tablename__ = "concert_url_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    url_hash = Column(String(64), unique=True, nullable=False, index=True)
+    url = Column(Text)
+    concert_json = Column(Text)
+    etag = Column(String(500), nullable=True)
+    last_modified = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<ConcertUrlCache {self.url}>"
+
+class OcrResultCache(Base):
+    """Cache for flight/concert OCR results keyed by image hash and prompt version (passports are never stored)"""
+    __tablename__ = "ocr_result_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    kind = Column(String(20), nullable=False)
+    result_json = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+    
+    def __repr__(self):
+        return f"<OcrResultCache {self.kind} {self.cache_key[:12]}>"
+
+class ProviderQuota(Base):
+    """Token bucket state per external API provider - shared by all app processes"""
+    __tablename__ = "provider_quotas"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_key = Column(String(100), unique=True, nullable=False, index=True)
+    provider = Column(String(50), nullable=False, index=True)
+    tokens = Column(Float, default=0)
+    capacity = Column(Float, nullable=False)
+    period_seconds = Column(Float, nullable=False)
+    total_requests = Column(Integer, default=0)
+    throttled_requests = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ProviderQuota {self.bucket_key}: {self.tokens:.1f}/{self.capacity:.0f}>"
+
+class ExchangeRate(Base):
+    """Latest Bank of Israel rate per currency (without margin) - shared by all app processes"""
+    __tablename__ = "exchange_rates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), unique=True, nullable=False, index=True)
+    rate = Column(Float, nullable=False)
+    rate_date = Column(String(20))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ExchangeRate {self.currency} {self.rate}>"
+
+class ExchangeRateHistory(Base):
+    """Daily Bank of Israel representative rate per currency (without margin), for reports"""
+    __tablename__ = "exchange_rate_history"
+    __table_args__ = (UniqueConstraint('currency', 'rate_date', name='uq_exchange_rate_history_currency_date'),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), nullable=False, index=True)
+    rate_date = Column(Date, nullable=False, index=True)
+    rate = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<ExchangeRateHistory {self.currency} {self.rate_date} {self.rate}>"
+
 class SavedConcert(Base):
     """User-saved concerts for quick reuse - manually entered events saved as favorites"""
     __tablename__ = "saved_concerts"
@@ -387,6 +509,63 @@ def run_migrations():
                 conn.execute(text("ALTER TABLE saved_concerts ADD COLUMN stadium_map_mime VARCHAR(50)"))
                 conn.commit()
                 print("Added stadium_map_data and stadium_map_mime columns to saved_concerts")
+            
+            # Add search tracking columns to concert_cache for background refresh
+            result = conn.execute(text("""
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'concert_cache' AND column_name = 'hit_count'
+            """))
+            if not result.fetchone():
+                conn.execute(text("ALTER TABLE concert_cache ADD COLUMN hit_count INTEGER DEFAULT 0"))
+                conn.execute(text("ALTER TABLE concert_cache ADD COLUMN last_accessed_at TIMESTAMP"))
+                conn.commit()
+                print("Added hit_count and last_accessed_at columns to concert_cache")
+            
+            # Add expiry, negative-result and file-check columns to hotel_cache
+            result = conn.execute(text("""
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'hotel_cache' AND column_name = 'expires_at'
+            """))
+            if not result.fetchone():
+                conn.execute(text("ALTER TABLE hotel_cache ADD COLUMN expires_at TIMESTAMP"))
+                conn.execute(text("ALTER TABLE hotel_cache ADD COLUMN is_negative BOOLEAN DEFAULT FALSE"))
+                conn.execute(text("ALTER TABLE hotel_cache ADD COLUMN files_checked_at TIMESTAMP"))
+                conn.commit()
+                print("Added expires_at, is_negative and files_checked_at columns to hotel_cache")
+            
+            # Add unreferenced_at to hotel_image_blobs (GC grace period start)
+            result = conn.execute(text("""
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'hotel_image_blobs' AND column_name = 'unreferenced_at'
+            """))
+            if not result.fetchone():
+                conn.execute(text("ALTER TABLE hotel_image_blobs ADD COLUMN unreferenced_at TIMESTAMP"))
+                conn.commit()
+                print("Added unreferenced_at column to hotel_image_blobs")
+            
+            # Composite indexes for keyset pagination of order history on (created_at, id)
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at DESC, id DESC)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_user_created_at_id ON orders (user_id, created_at DESC, id DESC)"))
+            conn.commit()
+            
+            # Add search_text to orders (filled by backfill_order_search_text)
+            result = conn.execute(text("""
+                SELECT column_name FROM information_schema.columns 
+                WHERE table_name = 'orders' AND column_name = 'search_text'
+            """))
+            if not result.fetchone():
+                conn.execute(text("ALTER TABLE orders ADD COLUMN search_text TEXT"))
+                conn.commit()
+                print("Added search_text column to orders")
+            
+            # Trigram GIN index so '%term%' search doesn't scan every order
+            try:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_search_text_trgm ON orders USING gin (search_text gin_trgm_ops)"))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Order search index not created (pg_trgm unavailable): {e}")
     except Exception as e:
         print(f"Migration check: {e}")
 
@@ -421,11 +600,35 @@ def migrate_file_maps_to_db():
     finally:
         db.close()
 
+def backfill_order_search_text(batch_size=500):
+    """Fill search_text for orders created before the column existed"""
+    db = get_db()
+    if not db:
+        return
+    try:
+        total = 0
+        while True:
+            orders = db.query(Order).filter(Order.search_text.is_(None)).limit(batch_size).all()
+            if not orders:
+                break
+            for order in orders:
+                order.search_text = build_order_search_text(order)
+            db.commit()
+            total += len(orders)
+        if total:
+            print(f"Filled search_text for {total} orders")
+    except Exception as e:
+        db.rollback()
+        print(f"Order search backfill error: {e}")
+    finally:
+        db.close()
+
 def init_db():
     """Initialize database tables"""
     if engine:
         Base.metadata.create_all(bind=engine)
         run_migrations()
+        backfill_order_search_text()
         migrate_file_maps_to_db()
         create_default_admin()
 
@@ -0,0 +1,154 @@
+"""
+Passport MRZ Reader
+Parses the machine-readable zone of passports (ICAO 9303 TD3: two lines of 44 characters)
+and validates its check digits, so most passports can be read locally in milliseconds.
+
+Reading the MRZ text from an image uses Tesseract through `pytesseract` when it is
+installed; without it read_mrz_from_image() returns None and callers fall back to Gemini.
+"""
+
+import io
+import re
+from datetime import date
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+TD3_LINE_LENGTH = 44
+# Share of the image height (from the bottom) searched for the MRZ
+MRZ_REGION_HEIGHT = 0.35
+TESSERACT_CONFIG = "--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+
+# Common OCR confusions in fields that can only hold digits
+_DIGIT_FIXES = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'B': '8', 'G': '6'})
+_CHAR_VALUES = {**{str(d): d for d in range(10)}, **{chr(ord('A') + i): 10 + i for i in range(26)}, '<': 0}
+_WEIGHTS = (7, 3, 1)
+# Tesseract often reads the '<' filler as 'K'; real names never contain runs like this
+_FILLER_MISREAD_RE = re.compile(r'K{3,}')
+MAX_NAME_PART_LENGTH = 24
+
+
+def check_digit(field: str) -> str:
+    """ICAO 9303 check digit (weights 7, 3, 1) of an MRZ field"""
+    total = sum(_CHAR_VALUES.get(ch, 0) * _WEIGHTS[i % 3] for i, ch in enumerate(field))
+    return str(total % 10)
+
+
+def _mrz_date(value: str, future: bool) -> str:
+    """YYMMDD to DD/MM/YYYY - expiry dates are in this century, birth dates are not in the future"""
+    yy, mm, dd = int(value[0:2]), value[2:4], value[4:6]
+    century = 2000
+    if not future and 2000 + yy > date.today().year:
+        century = 1900
+    return f"{dd}/{mm}/{century + yy}"
+
+
+def _clean_name(value: str) -> str:
+    return ' '.join(part for part in value.split('<') if part)
+
+
+def names_plausible(line1: str) -> bool:
+    """
+    Sanity check for the name field of MRZ line 1, which no check digit covers:
+    only A-Z and '<', a surname and '<<' separator, no misread filler ('KKK...')
+    and no implausibly long name parts.
+    """
+    names = line1[5:]
+    if not re.fullmatch(r'[A-Z<]+', names) or _FILLER_MISREAD_RE.search(names):
+        return False
+    surname, separator, given = names.partition('<<')
+    if not separator or len(surname.replace('<', '')) < 2:
+        return False
+    # The field is padded with filler - a line ending in letters means the filler was misread
+    if len(names.rstrip('<')) == len(names) and names.rstrip('K') != names:
+        return False
+    parts = [part for part in (surname + '<' + given).split('<') if part]
+    return all(len(part) <= MAX_NAME_PART_LENGTH for part in parts)
+
+
+def parse_td3(line1: str, line2: str) -> dict | None:
+    """
+    Parse a passport MRZ.
+
+    Returns:
+        dict with first_name, last_name, passport_number, birth_date, passport_expiry,
+        nationality, checks_passed (all four check digits valid) and names_plausible (see names_plausible()),
+        or None if the lines are not a TD3 MRZ
+    """
+    line1 = line1.strip().upper().replace(' ', '')
+    line2 = line2.strip().upper().replace(' ', '')
+    if len(line1) != TD3_LINE_LENGTH or len(line2) != TD3_LINE_LENGTH or line1[0] != 'P':
+        return None
+
+    # Digit-only positions: check digits, dates
+    digits = list(line2)
+    for pos in [9] + list(range(13, 20)) + list(range(21, 28)) + [42, 43]:
+        digits[pos] = digits[pos].translate(_DIGIT_FIXES)
+    line2 = ''.join(digits)
+
+    number, number_check = line2[0:9], line2[9]
+    birth, birth_check = line2[13:19], line2[19]
+    expiry, expiry_check = line2[21:27], line2[27]
+    composite_check = line2[43]
+    if not (birth.isdigit() and expiry.isdigit()):
+        return None
+
+    composite = line2[0:10] + line2[13:20] + line2[21:43]
+    checks_passed = (
+        check_digit(number) == number_check
+        and check_digit(birth) == birth_check
+        and check_digit(expiry) == expiry_check
+        and check_digit(composite) == composite_check
+    )
+
+    surname, _, given = line1[5:].partition('<<')
+    return {
+        'first_name': _clean_name(given),
+        'last_name': _clean_name(surname),
+        'passport_number': number.replace('<', ''),
+        'birth_date': _mrz_date(birth, future=False),
+        'passport_expiry': _mrz_date(expiry, future=True),
+        'nationality': line2[10:13].replace('<', ''),
+        'checks_passed': checks_passed,
+        'names_plausible': names_plausible(line1)
+    }
+
+
+def find_td3_lines(text: str) -> tuple | None:
+    """Find the two MRZ lines in OCR text (tolerating spaces and a few missing '<' fillers)"""
+    lines = [re.sub(r'[^A-Z0-9<]', '', line.upper()) for line in text.splitlines()]
+    lines = [line for line in lines if len(line) >= TD3_LINE_LENGTH - 4]
+    for first, second in zip(lines, lines[1:]):
+        if first.startswith('P'):
+            return first[:TD3_LINE_LENGTH].ljust(TD3_LINE_LENGTH, '<'), second[:TD3_LINE_LENGTH].ljust(TD3_LINE_LENGTH, '<')
+    return None
+
+
+def read_mrz_from_image(image_bytes: bytes) -> dict | None:
+    """
+    OCR the bottom of a passport image and parse its MRZ.
+
+    Returns:
+        parse_td3() result, or None if Tesseract is unavailable or no MRZ was found
+    """
+    if pytesseract is None:
+        return None
+
+    from PIL import Image, ImageOps
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            gray = ImageOps.grayscale(img)
+        top = int(gray.height * (1 - MRZ_REGION_HEIGHT))
+        region = ImageOps.autocontrast(gray.crop((0, top, gray.width, gray.height)))
+        if region.width < 1000:
+            scale = 1000 / region.width
+            region = region.resize((1000, int(region.height * scale)))
+        text = pytesseract.image_to_string(region, config=TESSERACT_CONFIG)
+    except Exception as e:
+        print(f"MRZ OCR error: {e}")
+        return None
+
+    lines = find_td3_lines(text)
+    return parse_td3(*lines) if lines else None
@@ -0,0 +1,135 @@
+"""
+OCR Result Cache
+Caches successful Gemini OCR results by a hash of the normalized image bytes and
+the prompt version, so re-scanning the same image returns instantly.
+
+Flight and concert results are kept in memory and in the shared database.
+Passport results contain personal data and are only kept in process memory
+(shared by all sessions of the app) for a short time - they never reach the database.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Time to live per OCR kind
+CACHE_TTLS = {
+    'passport': timedelta(minutes=int(os.environ.get('OCR_CACHE_PASSPORT_MINUTES', 30))),
+    'flight': timedelta(days=7),
+    'concert': timedelta(days=7),
+}
+# Kinds never written to the database
+MEMORY_ONLY_KINDS = {'passport'}
+MAX_MEMORY_ENTRIES = 500
+
+_memory_cache = {}
+_memory_lock = threading.Lock()
+
+
+def image_cache_key(kind: str, prompt_version: int, image_bytes: bytes) -> str:
+    """Cache key for an OCR kind, prompt version and (pre-processed) image"""
+    digest = hashlib.sha256()
+    digest.update(f"{kind}:v{prompt_version}:".encode('utf-8'))
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+def _purge_memory(now: datetime):
+    """Drop expired entries, then the oldest ones if the cache is still over MAX_MEMORY_ENTRIES"""
+    for key in [k for k, entry in _memory_cache.items() if entry['expires_at'] <= now]:
+        del _memory_cache[key]
+    if len(_memory_cache) > MAX_MEMORY_ENTRIES:
+        oldest = sorted(_memory_cache, key=lambda k: _memory_cache[k]['expires_at'])
+        for key in oldest[:len(_memory_cache) - MAX_MEMORY_ENTRIES]:
+            del _memory_cache[key]
+
+
+def get_cached_result(kind: str, cache_key: str):
+    """
+    Get a cached OCR result.
+
+    Returns:
+        Copy of the result with from_cache=True, or None
+    """
+    now = datetime.utcnow()
+    with _memory_lock:
+        entry = _memory_cache.get(cache_key)
+        if entry and entry['expires_at'] > now:
+            result = copy.deepcopy(entry['result'])
+            result['from_cache'] = True
+            return result
+
+    if kind in MEMORY_ONLY_KINDS:
+        return None
+
+    try:
+        from models import get_db, OcrResultCache
+        db = get_db()
+        if not db:
+            return None
+        cached = db.query(OcrResultCache).filter(
+            OcrResultCache.cache_key == cache_key,
+            OcrResultCache.expires_at > now
+        ).first()
+        db.close()
+        if not cached:
+            return None
+        result = json.loads(cached.result_json)
+        with _memory_lock:
+            _memory_cache[cache_key] = {'result': result, 'expires_at': cached.expires_at}
+        result = copy.deepcopy(result)
+        result['from_cache'] = True
+        return result
+    except Exception as e:
+        print(f"OCR cache read error: {e}")
+    return None
+
+
+def save_result(kind: str, cache_key: str, result: dict):
+    """Cache a successful OCR result for its kind's TTL (failed results are not cached)"""
+    if not result.get('success'):
+        return
+
+    now = datetime.utcnow()
+    expires_at = now + CACHE_TTLS.get(kind, timedelta(hours=1))
+    stored = {k: v for k, v in result.items() if k != 'from_cache'}
+    with _memory_lock:
+        _purge_memory(now)
+        _memory_cache[cache_key] = {'result': copy.deepcopy(stored), 'expires_at': expires_at}
+
+    if kind in MEMORY_ONLY_KINDS:
+        return
+
+    db = None
+    try:
+        from models import get_db, OcrResultCache
+        db = get_db()
+        if not db:
+            return
+
+        result_json = json.dumps(stored, ensure_ascii=False)
+        existing = db.query(OcrResultCache).filter(OcrResultCache.cache_key == cache_key).first()
+        if existing:
+            existing.result_json = result_json
+            existing.created_at = now
+            existing.expires_at = expires_at
+        else:
+            db.add(OcrResultCache(
+                cache_key=cache_key,
+                kind=kind,
+                result_json=result_json,
+                expires_at=expires_at
+            ))
+        db.query(OcrResultCache).filter(OcrResultCache.expires_at <= now).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+    except Exception as e:
+        print(f"OCR cache write error: {e}")
+        try:
+            db.rollback()
+            db.close()
+        except:
+            pass
@@ -0,0 +1,81 @@
+"""
+OCR Image Pre-processing
+Prepares passport, flight and concert images before they are sent to Gemini:
+auto-orients from EXIF, downscales to a size the model reads well, re-encodes
+as a correctly labelled JPEG, and optionally crops passports to the data page
+"""
+
+import io
+import os
+from PIL import Image, ImageOps
+
+# Longest side sent to the model - screenshots keep more pixels for small print
+PASSPORT_MAX_SIDE = 1280
+SCREENSHOT_MAX_SIDE = 1600
+JPEG_QUALITY = 88
+
+# Crop photos of an open passport booklet to the lower (data) page
+PASSPORT_CROP_DATA_PAGE = os.environ.get("PASSPORT_CROP_DATA_PAGE", "").lower() in ("1", "true", "yes")
+# Portrait images taller than this ratio are treated as a full open booklet
+BOOKLET_MIN_ASPECT = 1.25
+
+
+def _sniff_mime_type(image_bytes: bytes) -> str:
+    """Mime type from the file signature, for bytes PIL cannot open"""
+    if image_bytes.startswith(b'\x89PNG'):
+        return 'image/png'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def _crop_data_page(img: Image.Image) -> Image.Image:
+    """Keep the lower page of an open passport booklet (photo page with the MRZ)"""
+    if img.height < img.width * BOOKLET_MIN_ASPECT:
+        return img
+    return img.crop((0, img.height // 2, img.width, img.height))
+
+
+def prepare_ocr_image(image_bytes: bytes, max_side: int = SCREENSHOT_MAX_SIDE, crop_passport: bool = False) -> tuple:
+    """
+    Normalize an image for Gemini vision.
+
+    Args:
+        image_bytes: Uploaded or pasted image (JPEG, PNG, WebP...)
+        max_side: Longest side of the returned image in pixels
+        crop_passport: Crop an open passport booklet to its data page
+
+    Returns:
+        (image bytes, mime type). Small, upright JPEGs are returned unchanged;
+        bytes PIL cannot read are returned as-is with the mime type from their signature
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            source_format = img.format
+            orientation = img.getexif().get(0x0112, 1)
+            if (source_format == 'JPEG' and orientation == 1 and not crop_passport
+                    and max(img.size) <= max_side):
+                return image_bytes, 'image/jpeg'
+
+            # Large JPEGs decode straight at a reduced scale
+            img.draft('RGB', (max_side, max_side))
+            img = ImageOps.exif_transpose(img)
+
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel('A'))
+                img = background
+            else:
+                img = img.convert('RGB')
+
+            if crop_passport:
+                img = _crop_data_page(img)
+
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            output = io.BytesIO()
+            img.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            return output.getvalue(), 'image/jpeg'
+    except Exception as e:
+        print(f"OCR image pre-processing failed, sending original: {e}")
+        return image_bytes, _sniff_mime_type(image_bytes)
@@ -0,0 +1,135 @@
+"""
+OCR Structured Output
+Helpers for Gemini JSON responses declared with a response schema:
+repairs slightly malformed or truncated JSON locally (no second model call)
+and coerces the parsed data to the schema so every field has the declared type
+"""
+
+import json
+import re
+
+_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def json_config(schema: dict):
+    """GenerateContentConfig asking for JSON that follows `schema`"""
+    from google.genai import types
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema
+    )
+
+
+def _close_json(text: str) -> str:
+    """Close an unterminated string and any open objects/arrays (e.g. output cut off at the token limit)"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]' and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(',')
+    if text.endswith(':'):
+        text += ' ""'
+    return text + ''.join(reversed(stack))
+
+
+def parse_json_response(text: str) -> dict:
+    """
+    Parse a model JSON response, repairing common defects locally:
+    code fences, text around the object, trailing commas and truncated output.
+
+    Raises:
+        json.JSONDecodeError if the text cannot be repaired into a JSON object
+    """
+    text = _FENCE_RE.sub('', (text or '').strip())
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data
+    except json.JSONDecodeError as e:
+        error = e
+    else:
+        raise json.JSONDecodeError("Expected a JSON object", text, 0)
+
+    start = text.find('{')
+    if start == -1:
+        raise error
+    candidate = text[start:]
+    end = candidate.rfind('}')
+    for attempt in ([candidate[:end + 1]] if end != -1 else []) + [candidate]:
+        repaired = _close_json(_TRAILING_COMMA_RE.sub(r'\1', attempt))
+        try:
+            data = json.loads(_TRAILING_COMMA_RE.sub(r'\1', repaired))
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            continue
+    raise error
+
+
+def _coerce_string(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (list, dict)):
+        return ""
+    return str(value).strip()
+
+
+def coerce_to_schema(value, schema: dict):
+    """
+    Coerce parsed JSON to a response schema: missing fields get empty values,
+    numbers become strings where strings are declared, a single object becomes a one-item array,
+    and unknown keys are dropped.
+    """
+    kind = schema.get('type', 'STRING').upper()
+
+    if kind == 'OBJECT':
+        value = value if isinstance(value, dict) else {}
+        return {
+            key: coerce_to_schema(value.get(key), prop)
+            for key, prop in schema.get('properties', {}).items()
+        }
+
+    if kind == 'ARRAY':
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            value = [value]
+        item_schema = schema.get('items', {'type': 'STRING'})
+        if item_schema.get('type', '').upper() == 'OBJECT':
+            value = [item for item in value if isinstance(item, dict)]
+        return [coerce_to_schema(item, item_schema) for item in value]
+
+    if kind in ('NUMBER', 'INTEGER'):
+        try:
+            number = float(str(value).replace(',', '').strip())
+            return int(number) if kind == 'INTEGER' else number
+        except (TypeError, ValueError):
+            return None
+
+    text = _coerce_string(value)
+    enum = schema.get('enum')
+    if enum and text:
+        match = next((option for option in enum if option.lower() == text.lower()), None)
+        text = match or text
+    return text
@@ -0,0 +1,61 @@
+"""
+Order Search
+Searches orders by customer, event, order number and email through Order.search_text -
+a normalized copy of those fields (niqqud removed, Hebrew final letters unified) kept up to
+date on every insert/update. On PostgreSQL with pg_trgm the '%term%' filters use the
+ix_orders_search_text_trgm GIN index and results are ranked by trigram word similarity;
+elsewhere the same filters run without the index and results are ordered by date.
+"""
+
+import threading
+from sqlalchemy import func, text
+
+from models import Order, normalize_search_text
+
+_trigram_available = None
+_trigram_lock = threading.Lock()
+
+
+def search_terms(search_query: str) -> list:
+    """Normalized terms of a search box query"""
+    return normalize_search_text(search_query).split()
+
+
+def has_trigram_index(db) -> bool:
+    """Whether pg_trgm is installed (cached once known; a failed check is retried next time)"""
+    global _trigram_available
+    with _trigram_lock:
+        if _trigram_available is None:
+            try:
+                _trigram_available = db.bind.dialect.name == 'postgresql' and db.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first() is not None
+            except Exception as e:
+                print(f"pg_trgm check failed: {e}")
+                db.rollback()
+                return False
+        return _trigram_available
+
+
+def apply_search(query, search_query: str):
+    """Filter an Order query to rows containing every term of search_query"""
+    for term in search_terms(search_query):
+        query = query.filter(Order.search_text.contains(term, autoescape=True))
+    return query
+
+
+def rank_search(db, query, search_query: str):
+    """
+    Order a query filtered by apply_search() by relevance: trigram word similarity
+    between the normalized search and Order.search_text, then newest first.
+    Without pg_trgm the query keeps its existing (date) order.
+    """
+    normalized = normalize_search_text(search_query)
+    if normalized and has_trigram_index(db):
+        query = query.order_by(None).order_by(
+            func.word_similarity(normalized, Order.search_text).desc(),
+            Order.created_at.desc(),
+            Order.id.desc()
+        )
+    return query
+
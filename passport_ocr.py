@@ -1,34 +1,134 @@
 """
-Passport OCR using Gemini AI
-Extracts passenger details from passport images
+Passport OCR
+Extracts passenger details from passport images.
+Engines are tried in order (PASSPORT_OCR_ENGINES): the local MRZ reader answers when
+all its check digits pass, otherwise Gemini AI reads the passport
 """
 
 import os
 import json
-import time
-from google import genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.genai import types
+from gemini_client import generate_content
+from ocr_image import prepare_ocr_image, PASSPORT_MAX_SIDE, PASSPORT_CROP_DATA_PAGE
+from ocr_cache import image_cache_key, get_cached_result, save_result
+from ocr_output import json_config, parse_json_response, coerce_to_schema
+from mrz import read_mrz_from_image
 
-AI_INTEGRATIONS_GEMINI_API_KEY = os.environ.get("AI_INTEGRATIONS_GEMINI_API_KEY")
-AI_INTEGRATIONS_GEMINI_BASE_URL = os.environ.get("AI_INTEGRATIONS_GEMINI_BASE_URL")
+# Part of the OCR cache key - bump when the prompt changes
+PROMPT_VERSION = 2
 
-def get_client():
-    """Create a new client instance to avoid stale connections"""
-    return genai.Client(
-        api_key=AI_INTEGRATIONS_GEMINI_API_KEY,
-        http_options={
-            'api_version': '',
-            'base_url': AI_INTEGRATIONS_GEMINI_BASE_URL   
+# Declared to Gemini as the response schema; parsed output is coerced to it
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'first_name': {'type': 'STRING'},
+        'last_name': {'type': 'STRING'},
+        'passport_number': {'type': 'STRING'},
+        'birth_date': {'type': 'STRING', 'description': 'DD/MM/YYYY'},
+        'passport_expiry': {'type': 'STRING', 'description': 'DD/MM/YYYY'},
+    },
+    'required': ['first_name', 'last_name', 'passport_number', 'birth_date', 'passport_expiry'],
+}
+
+# How many passports are sent to Gemini at the same time
+PASSPORT_SCAN_CONCURRENCY = int(os.environ.get("PASSPORT_SCAN_CONCURRENCY", 4))
+
+# Extraction engines in the order they are tried
+PASSPORT_OCR_ENGINES = [e.strip() for e in os.environ.get("PASSPORT_OCR_ENGINES", "mrz,gemini").split(",") if e.strip()]
+
+def extract_with_mrz(image_bytes: bytes, mime_type: str, max_retries: int) -> dict | None:
+    """Read the passport's machine-readable zone locally; None unless every check digit is valid and the names look sane"""
+    mrz = read_mrz_from_image(image_bytes)
+    if not mrz or not mrz['checks_passed'] or not mrz['names_plausible']:
+        return None
+    return {
+        "first_name": mrz['first_name'],
+        "last_name": mrz['last_name'],
+        "passport_number": mrz['passport_number'],
+        "birth_date": mrz['birth_date'],
+        "passport_expiry": mrz['passport_expiry'],
+        "success": True,
+        "error": None
+    }
+
+def extract_with_gemini(image_bytes: bytes, mime_type: str, max_retries: int) -> dict:
+    """Read the passport with Gemini Vision"""
+    prompt = """Analyze this passport image and extract the following information.
+Return ONLY a valid JSON object with these exact keys (no markdown, no explanation):
+{
+    "first_name": "the given/first name exactly as shown",
+    "last_name": "the surname/family name exactly as shown", 
+    "passport_number": "the passport number",
+    "birth_date": "date of birth in DD/MM/YYYY format",
+    "passport_expiry": "passport expiry date in DD/MM/YYYY format"
+}
+
+If any field cannot be found, use an empty string for that field.
+Return ONLY the JSON object, nothing else."""
+
+    try:
+        response = generate_content(
+            contents=[
+                prompt,
+                types.Part(
+                    inline_data=types.Blob(
+                        mime_type=mime_type,
+                        data=image_bytes
+                    )
+                )
+            ],
+            config=json_config(RESPONSE_SCHEMA),
+            max_attempts=max_retries
+        )
+        
+        data = coerce_to_schema(parse_json_response(response.text), RESPONSE_SCHEMA)
+        
+        return {
+            "first_name": data.get("first_name", ""),
+            "last_name": data.get("last_name", ""),
+            "passport_number": data.get("passport_number", ""),
+            "birth_date": data.get("birth_date", ""),
+            "passport_expiry": data.get("passport_expiry", ""),
+            "success": True,
+            "error": None
+        }
+        
+    except json.JSONDecodeError as e:
+        return {
+            "first_name": "",
+            "last_name": "",
+            "passport_number": "",
+            "birth_date": "",
+            "passport_expiry": "",
+            "success": False,
+            "error": f"Could not parse response: {str(e)}"
+        }
+    except Exception as e:
+        return {
+            "first_name": "",
+            "last_name": "",
+            "passport_number": "",
+            "birth_date": "",
+            "passport_expiry": "",
+            "success": False,
+            "error": str(e)
         }
-    )
+
+
+PASSPORT_EXTRACTORS = {
+    'mrz': extract_with_mrz,
+    'gemini': extract_with_gemini,
+}
+
 
 def extract_passport_data(image_bytes: bytes, max_retries: int = 3) -> dict:
     """
-    Extract passport information from an image using Gemini Vision.
+    Extract passport information from an image, trying each engine in PASSPORT_OCR_ENGINES.
     
     Args:
         image_bytes: The passport image as bytes
-        max_retries: Number of retry attempts for network errors
+        max_retries: Total Gemini attempts for transient errors (timeouts, 429, 5xx, connection drops)
         
     Returns:
         Dictionary with extracted fields:
@@ -37,80 +137,24 @@ def extract_passport_data(image_bytes: bytes, max_retries: int = 3) -> dict:
         - passport_number: Passport number
         - birth_date: Date of birth (DD/MM/YYYY)
         - passport_expiry: Passport expiry date (DD/MM/YYYY)
+        - engine: Engine that answered ('mrz' or 'gemini')
     """
-    prompt = """Analyze this passport image and extract the following information.
-Return ONLY a valid JSON object with these exact keys (no markdown, no explanation):
-{
-    "first_name": "the given/first name exactly as shown",
-    "last_name": "the surname/family name exactly as shown", 
-    "passport_number": "the passport number",
-    "birth_date": "date of birth in DD/MM/YYYY format",
-    "passport_expiry": "passport expiry date in DD/MM/YYYY format"
-}
-
-If any field cannot be found, use an empty string for that field.
-Return ONLY the JSON object, nothing else."""
-
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            client = get_client()
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    prompt,
-                    types.Part(
-                        inline_data=types.Blob(
-                            mime_type="image/jpeg",
-                            data=image_bytes
-                        )
-                    )
-                ]
-            )
-            
-            result_text = response.text.strip()
-            
-            if result_text.startswith("```"):
-                lines = result_text.split('\n')
-                result_text = '\n'.join(lines[1:-1])
-            
-            data = json.loads(result_text)
-            
-            return {
-                "first_name": data.get("first_name", ""),
-                "last_name": data.get("last_name", ""),
-                "passport_number": data.get("passport_number", ""),
-                "birth_date": data.get("birth_date", ""),
-                "passport_expiry": data.get("passport_expiry", ""),
-                "success": True,
-                "error": None
-            }
-            
-        except json.JSONDecodeError as e:
-            return {
-                "first_name": "",
-                "last_name": "",
-                "passport_number": "",
-                "birth_date": "",
-                "passport_expiry": "",
-                "success": False,
-                "error": f"Could not parse response: {str(e)}"
-            }
-        except Exception as e:
-            last_error = str(e)
-            if "Connection refused" in last_error or "111" in last_error:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-            return {
-                "first_name": "",
-                "last_name": "",
-                "passport_number": "",
-                "birth_date": "",
-                "passport_expiry": "",
-                "success": False,
-                "error": last_error
-            }
+    image_bytes, mime_type = prepare_ocr_image(image_bytes, PASSPORT_MAX_SIDE, crop_passport=PASSPORT_CROP_DATA_PAGE)
+    cache_key = image_cache_key('passport', PROMPT_VERSION, image_bytes)
+    cached = get_cached_result('passport', cache_key)
+    if cached:
+        return cached
+    
+    for name in PASSPORT_OCR_ENGINES:
+        extractor = PASSPORT_EXTRACTORS.get(name)
+        if not extractor:
+            continue
+        result = extractor(image_bytes, mime_type, max_retries)
+        if result is None:
+            continue
+        result["engine"] = name
+        save_result('passport', cache_key, result)
+        return result
     
     return {
         "first_name": "",
@@ -119,5 +163,38 @@ Return ONLY the JSON object, nothing else."""
         "birth_date": "",
         "passport_expiry": "",
         "success": False,
-        "error": f"Failed after {max_retries} attempts: {last_error}"
+        "error": "No passport OCR engine could read the image",
+        "engine": None
     }
+
+def scan_passports(images: list, max_workers: int = PASSPORT_SCAN_CONCURRENCY):
+    """
+    Extract several passports concurrently, yielding each result as soon as it is ready.
+    A failed scan yields its error result and does not stop the others.
+    
+    Args:
+        images: List of passport images as bytes
+        max_workers: Maximum number of concurrent Gemini requests
+        
+    Yields:
+        (index in images, extract_passport_data result) in completion order
+    """
+    if not images:
+        return
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(images))), thread_name_prefix='passport-ocr') as pool:
+        futures = {pool.submit(extract_passport_data, image_bytes): idx for idx, image_bytes in enumerate(images)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {
+                    "first_name": "",
+                    "last_name": "",
+                    "passport_number": "",
+                    "birth_date": "",
+                    "passport_expiry": "",
+                    "success": False,
+                    "error": str(e)
+                }
+            yield futures[future], result
@@ -0,0 +1,212 @@
+"""
+Exchange Rate History
+Daily Bank of Israel representative rates (EUR, USD, GBP to ILS, without margin)
+stored in the exchange_rate_history table, and vectorised conversion of whole
+amount columns for reports - one as-of lookup per column instead of one rate per order.
+
+Backfill or top up the table:
+    python rate_history.py --days 1095
+"""
+
+import argparse
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from exchange_rates import CURRENCIES, RATE_MARGIN, fetch_rate_history
+
+# How far back an empty table is filled
+HISTORY_START_DAYS = 3 * 365
+# Weekends and holidays have no rate - look back this far for the last published one
+MAX_RATE_GAP_DAYS = 10
+# start_rate_history_sync() asks the Bank of Israel at most this often per process
+SYNC_INTERVAL_SECONDS = 60 * 60
+
+_last_sync = 0.0
+_sync_lock = threading.Lock()
+
+
+def _stored_until(db, currencies: list) -> dict:
+    """Latest stored rate date per currency"""
+    from sqlalchemy import func
+    from models import ExchangeRateHistory
+    rows = db.query(ExchangeRateHistory.currency, func.max(ExchangeRateHistory.rate_date)).filter(
+        ExchangeRateHistory.currency.in_(currencies)
+    ).group_by(ExchangeRateHistory.currency).all()
+    return dict(rows)
+
+
+def sync_rate_history(currencies: list = None, start_date: date = None, end_date: date = None) -> int:
+    """
+    Add the daily rates missing from exchange_rate_history, in one Bank of Israel request.
+    Each currency continues from its latest stored date (or start_date / HISTORY_START_DAYS ago).
+
+    Returns:
+        Number of rows added
+    """
+    from models import get_db, ExchangeRateHistory
+    currencies = currencies or CURRENCIES
+    end_date = end_date or date.today()
+    db = get_db()
+    if not db:
+        return 0
+
+    try:
+        stored = _stored_until(db, currencies)
+        default_start = start_date or end_date - timedelta(days=HISTORY_START_DAYS)
+        starts = {c: stored[c] + timedelta(days=1) if c in stored else default_start for c in currencies}
+        fetch_start = min(starts.values())
+        if fetch_start > end_date:
+            return 0
+
+        rows = []
+        for currency, period, rate in fetch_rate_history(currencies, fetch_start, end_date):
+            try:
+                rate_date = date.fromisoformat(period[:10])
+            except ValueError:
+                continue
+            if rate_date >= starts[currency]:
+                rows.append({'currency': currency, 'rate_date': rate_date, 'rate': rate})
+        # The same day can appear twice if the response repeats an observation
+        rows = list({(r['currency'], r['rate_date']): r for r in rows}.values())
+        if rows:
+            db.bulk_insert_mappings(ExchangeRateHistory, rows)
+            db.commit()
+        return len(rows)
+    except Exception as e:
+        print(f"Exchange rate history sync error: {e}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+
+def start_rate_history_sync() -> bool:
+    """
+    Run sync_rate_history() in a background thread, at most once per SYNC_INTERVAL_SECONDS.
+    Safe to call on every Streamlit rerun - the first call on an empty table backfills
+    HISTORY_START_DAYS without holding up the page.
+    
+    Returns:
+        True if a sync was started
+    """
+    global _last_sync
+    with _sync_lock:
+        if _last_sync and time.monotonic() - _last_sync < SYNC_INTERVAL_SECONDS:
+            return False
+        _last_sync = time.monotonic()
+    threading.Thread(target=sync_rate_history, name='rate-history-sync', daemon=True).start()
+    return True
+
+
+def load_rate_history(currency: str = 'EUR', start_date: date = None, end_date: date = None) -> pd.Series:
+    """
+    Stored daily rates of one currency, as a float Series indexed by datetime64 date (ascending).
+    The range is widened by MAX_RATE_GAP_DAYS so the first dates have a preceding rate.
+    """
+    from models import get_db, ExchangeRateHistory
+    db = get_db()
+    if not db:
+        return pd.Series(dtype=float)
+    try:
+        query = db.query(ExchangeRateHistory.rate_date, ExchangeRateHistory.rate).filter(
+            ExchangeRateHistory.currency == currency
+        )
+        if start_date:
+            query = query.filter(ExchangeRateHistory.rate_date >= start_date - timedelta(days=MAX_RATE_GAP_DAYS))
+        if end_date:
+            query = query.filter(ExchangeRateHistory.rate_date <= end_date)
+        rows = query.order_by(ExchangeRateHistory.rate_date).all()
+    finally:
+        db.close()
+    if not rows:
+        return pd.Series(dtype=float)
+    dates, rates = zip(*rows)
+    return pd.Series(rates, index=pd.to_datetime(list(dates)), dtype=float)
+
+
+def rates_on_dates(dates, currency: str = 'EUR', history: pd.Series = None) -> np.ndarray:
+    """
+    Bank of Israel rate in effect on each date: the last published rate on or before it,
+    at most MAX_RATE_GAP_DAYS old. Dates without one get NaN.
+
+    Args:
+        dates: Anything pandas can turn into datetimes (column, list, array); times are ignored
+        currency: EUR, USD or GBP
+        history: Rates from load_rate_history(); loaded for the dates' range when omitted
+    """
+    days = pd.to_datetime(pd.Series(dates), errors='coerce').dt.normalize().to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(days)
+    if history is None:
+        if not valid.any():
+            return np.full(len(days), np.nan)
+        history = load_rate_history(
+            currency, pd.Timestamp(days[valid].min()).date(), pd.Timestamp(days[valid].max()).date()
+        )
+
+    result = np.full(len(days), np.nan)
+    if history.empty:
+        return result
+    history_days = history.index.to_numpy(dtype='datetime64[ns]')
+    positions = np.searchsorted(history_days, days, side='right') - 1
+    found = valid & (positions >= 0)
+    positions = np.where(found, positions, 0)
+    age = days - history_days[positions]
+    found &= age <= np.timedelta64(MAX_RATE_GAP_DAYS, 'D')
+    result[found] = history.to_numpy()[positions[found]]
+    return result
+
+
+def convert_to_ils(amounts, dates, currency: str = 'EUR', margin: float = 0.0, history: pd.Series = None) -> np.ndarray:
+    """
+    Convert a column of foreign-currency amounts to ILS at each row's historical rate (+ margin).
+    Rows without a rate come back as NaN.
+    """
+    rates = rates_on_dates(dates, currency, history)
+    return np.asarray(amounts, dtype=float) * (rates + margin)
+
+
+def add_rate_columns(df: pd.DataFrame, amount_column: str = 'total_euro', date_column: str = 'created_at',
+                     rate_column: str = 'exchange_rate', currency: str = 'EUR', today_rate: float = None) -> pd.DataFrame:
+    """
+    Add report columns to an orders DataFrame in one pass:
+        boi_rate       - Bank of Israel rate on the order date
+        rate_margin    - applied rate minus boi_rate (if rate_column exists)
+        nis_at_boi     - amount at boi_rate
+        nis_today      - amount at today_rate (latest stored rate + RATE_MARGIN when omitted)
+    
+    Rows whose amount is missing or 0 get NaN in all four: orders don't store their currency,
+    and USD/GBP orders keep total_euro=0 with a USD/GBP exchange_rate, so comparing them
+    against `currency` rates would be wrong.
+    """
+    df = df.copy()
+    dates = pd.to_datetime(df[date_column], errors='coerce')
+    history = pd.Series(dtype=float)
+    if dates.notna().any():
+        history = load_rate_history(currency, dates.min().date(), dates.max().date())
+    amounts = pd.to_numeric(df[amount_column], errors='coerce').to_numpy(dtype=float)
+    amounts[amounts == 0] = np.nan
+
+    boi_rates = rates_on_dates(dates, currency, history)
+    boi_rates[np.isnan(amounts)] = np.nan
+    df['boi_rate'] = boi_rates
+    if rate_column in df:
+        df['rate_margin'] = pd.to_numeric(df[rate_column], errors='coerce').to_numpy(dtype=float) - df['boi_rate'].to_numpy()
+    df['nis_at_boi'] = amounts * df['boi_rate'].to_numpy()
+
+    if today_rate is None:
+        latest = load_rate_history(currency, date.today() - timedelta(days=MAX_RATE_GAP_DAYS))
+        today_rate = latest.iloc[-1] + RATE_MARGIN if not latest.empty else np.nan
+    df['nis_today'] = amounts * today_rate
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the exchange rate history table from the Bank of Israel")
+    parser.add_argument('--days', type=int, default=HISTORY_START_DAYS, help="How far back to fill an empty table")
+    args = parser.parse_args()
+    added = sync_rate_history(start_date=date.today() - timedelta(days=args.days))
+    print(f"Added {added} daily rates")
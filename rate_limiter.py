@@ -0,0 +1,289 @@
+"""
+Provider Rate Limiter
+Token bucket rate limiting for external APIs (Ticketmaster, RapidAPI, Google Places)
+Bucket state is stored in the database so all app processes share one budget,
+with an in-process fallback when the database is unavailable
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+# Each provider has one or more buckets: (name, capacity, period in seconds).
+# A bucket refills `capacity` tokens per `period`; a request takes one token from every bucket.
+PROVIDER_LIMITS = {
+    'ticketmaster': [
+        ('burst', float(os.environ.get('TICKETMASTER_RATE_PER_SECOND', 5)), 1),
+        ('daily', float(os.environ.get('TICKETMASTER_DAILY_QUOTA', 5000)), 86400),
+    ],
+    'rapidapi': [
+        ('burst', float(os.environ.get('RAPIDAPI_RATE_PER_SECOND', 2)), 1),
+        ('daily', float(os.environ.get('RAPIDAPI_DAILY_QUOTA', 1000)), 86400),
+    ],
+    'google_places': [
+        ('burst', float(os.environ.get('GOOGLE_PLACES_RATE_PER_SECOND', 10)), 1),
+        ('daily', float(os.environ.get('GOOGLE_PLACES_DAILY_QUOTA', 5000)), 86400),
+    ],
+}
+
+PROVIDER_NAMES = {
+    'ticketmaster': 'Ticketmaster',
+    'rapidapi': 'RapidAPI',
+    'google_places': 'Google Places',
+}
+
+# How long a request may queue for a token before the caller degrades to cached data
+MAX_WAIT_SECONDS = 3
+
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+class _LocalBucket:
+    """In-process bucket used when the shared database is unavailable"""
+
+    def __init__(self, bucket_key, provider, capacity, period_seconds):
+        self.bucket_key = bucket_key
+        self.provider = provider
+        self.tokens = capacity
+        self.capacity = capacity
+        self.period_seconds = period_seconds
+        self.total_requests = 0
+        self.throttled_requests = 0
+        self.updated_at = datetime.utcnow()
+
+
+def _bucket_key(provider: str, name: str) -> str:
+    return f"{provider}:{name}"
+
+
+def _refill(bucket, now: datetime):
+    """Add the tokens earned since the bucket was last updated"""
+    elapsed = max(0.0, (now - bucket.updated_at).total_seconds()) if bucket.updated_at else 0.0
+    rate = bucket.capacity / bucket.period_seconds
+    bucket.tokens = min(bucket.capacity, (bucket.tokens or 0) + elapsed * rate)
+    bucket.updated_at = now
+
+
+def _take(buckets, count: float, max_wait: float, now: datetime) -> float:
+    """
+    Take `count` tokens from every bucket, or none if any bucket is short.
+
+    Returns:
+        0 if the tokens were taken, otherwise seconds until they will be available
+    """
+    wait = 0.0
+    for bucket in buckets:
+        _refill(bucket, now)
+        if bucket.tokens < count:
+            rate = bucket.capacity / bucket.period_seconds
+            wait = max(wait, (count - bucket.tokens) / rate)
+
+    if wait <= 0:
+        for bucket in buckets:
+            bucket.tokens -= count
+            bucket.total_requests = (bucket.total_requests or 0) + 1
+    elif wait > max_wait:
+        for bucket in buckets:
+            bucket.throttled_requests = (bucket.throttled_requests or 0) + 1
+    return wait
+
+
+def _get_local_buckets(provider: str) -> list:
+    buckets = []
+    for name, capacity, period in PROVIDER_LIMITS[provider]:
+        key = _bucket_key(provider, name)
+        if key not in _local_buckets:
+            _local_buckets[key] = _LocalBucket(key, provider, capacity, period)
+        bucket = _local_buckets[key]
+        bucket.capacity = capacity
+        bucket.period_seconds = period
+        buckets.append(bucket)
+    return buckets
+
+
+def _ensure_db_buckets(db, provider: str):
+    """Create missing bucket rows (full) for a provider"""
+    from models import ProviderQuota
+    from sqlalchemy.exc import IntegrityError
+
+    keys = [_bucket_key(provider, name) for name, _, _ in PROVIDER_LIMITS[provider]]
+    existing = {k for (k,) in db.query(ProviderQuota.bucket_key).filter(ProviderQuota.bucket_key.in_(keys)).all()}
+    if len(existing) == len(keys):
+        return
+
+    for name, capacity, period in PROVIDER_LIMITS[provider]:
+        key = _bucket_key(provider, name)
+        if key not in existing:
+            db.add(ProviderQuota(
+                bucket_key=key,
+                provider=provider,
+                tokens=capacity,
+                capacity=capacity,
+                period_seconds=period,
+                updated_at=datetime.utcnow()
+            ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process created them first
+        db.rollback()
+
+
+def _get_db_buckets(db, provider: str, lock: bool = True) -> list:
+    """Load a provider's bucket rows, locked for update, in a consistent order"""
+    from models import ProviderQuota
+
+    _ensure_db_buckets(db, provider)
+    query = db.query(ProviderQuota).filter(ProviderQuota.provider == provider).order_by(ProviderQuota.bucket_key)
+    if lock:
+        query = query.with_for_update()
+    rows = query.all()
+
+    limits = {_bucket_key(provider, name): (capacity, period) for name, capacity, period in PROVIDER_LIMITS[provider]}
+    buckets = []
+    for row in rows:
+        if row.bucket_key in limits:
+            row.capacity, row.period_seconds = limits[row.bucket_key]
+            buckets.append(row)
+    return buckets
+
+
+def _try_take(provider: str, count: float, max_wait: float) -> float:
+    """Try to take tokens from the shared buckets, falling back to in-process buckets"""
+    from models import get_db
+    db = get_db()
+    if db:
+        try:
+            buckets = _get_db_buckets(db, provider)
+            wait = _take(buckets, count, max_wait, datetime.utcnow())
+            db.commit()
+            return wait
+        except Exception as e:
+            db.rollback()
+            print(f"Rate limiter DB error: {e}")
+        finally:
+            db.close()
+
+    with _local_lock:
+        return _take(_get_local_buckets(provider), count, max_wait, datetime.utcnow())
+
+
+def acquire(provider: str, max_wait: float = MAX_WAIT_SECONDS, count: float = 1) -> bool:
+    """
+    Take a request token for a provider, queueing up to max_wait seconds if the budget is empty.
+
+    Args:
+        provider: Key in PROVIDER_LIMITS ('ticketmaster', 'rapidapi', 'google_places')
+        max_wait: Longest time to wait for a token before giving up
+        count: Number of tokens to take
+
+    Returns:
+        True if the request may proceed, False if the caller should use cached data instead
+    """
+    if provider not in PROVIDER_LIMITS:
+        return True
+
+    deadline = time.monotonic() + max_wait
+    while True:
+        remaining_wait = max(0.0, deadline - time.monotonic())
+        wait = _try_take(provider, count, remaining_wait)
+        if wait <= 0:
+            return True
+        if wait > remaining_wait:
+            return False
+        time.sleep(wait)
+
+
+def report_rate_limited(provider: str, retry_after: float = None):
+    """
+    Empty a provider's buckets after it answered 429, so every process backs off.
+    Only buckets whose period is within the Retry-After window are drained.
+    """
+    if provider not in PROVIDER_LIMITS:
+        return
+
+    window = retry_after if retry_after else min(period for _, _, period in PROVIDER_LIMITS[provider])
+
+    def drain(buckets):
+        now = datetime.utcnow()
+        for bucket in buckets:
+            _refill(bucket, now)
+            if bucket.period_seconds <= window:
+                bucket.tokens = 0
+            bucket.throttled_requests = (bucket.throttled_requests or 0) + 1
+
+    from models import get_db
+    db = get_db()
+    if db:
+        try:
+            drain(_get_db_buckets(db, provider))
+            db.commit()
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"Rate limiter DB error: {e}")
+        finally:
+            db.close()
+
+    with _local_lock:
+        drain(_get_local_buckets(provider))
+
+
+def get_quota_status(provider: str = None) -> list:
+    """
+    Get remaining budget for every bucket (without taking tokens).
+
+    Returns:
+        List of dicts with provider, bucket, remaining, capacity, period_seconds,
+        total_requests, throttled_requests and shared (True if read from the database)
+    """
+    providers = [provider] if provider else list(PROVIDER_LIMITS)
+    status = []
+
+    from models import get_db
+    db = get_db()
+    for p in providers:
+        if p not in PROVIDER_LIMITS:
+            continue
+        buckets = None
+        shared = False
+        if db:
+            try:
+                buckets = _get_db_buckets(db, p, lock=False)
+                shared = True
+            except Exception as e:
+                db.rollback()
+                print(f"Rate limiter DB error: {e}")
+        if buckets is None:
+            with _local_lock:
+                buckets = _get_local_buckets(p)
+
+        now = datetime.utcnow()
+        for bucket in buckets:
+            elapsed = max(0.0, (now - bucket.updated_at).total_seconds()) if bucket.updated_at else 0.0
+            remaining = min(bucket.capacity, (bucket.tokens or 0) + elapsed * bucket.capacity / bucket.period_seconds)
+            status.append({
+                'provider': p,
+                'bucket': bucket.bucket_key.split(':', 1)[1],
+                'remaining': remaining,
+                'capacity': bucket.capacity,
+                'period_seconds': bucket.period_seconds,
+                'total_requests': bucket.total_requests or 0,
+                'throttled_requests': bucket.throttled_requests or 0,
+                'shared': shared
+            })
+    if db:
+        db.close()
+    return status
+
+
+def has_budget(provider: str, min_fraction: float) -> bool:
+    """Check that every quota bucket of a provider is at least min_fraction full (burst buckets are ignored)"""
+    for bucket in get_quota_status(provider):
+        if bucket['period_seconds'] < 60:
+            continue
+        if bucket['remaining'] < bucket['capacity'] * min_fraction:
+            return False
+    return True